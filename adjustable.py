@@ -0,0 +1,86 @@
+"""
+Adjustable-rate (ARM) and rate-reset mortgages.
+
+A rate path is a list of segments: the month each segment starts and the annual rate during it. At every
+reset the payment is recomputed with pmt over the remaining balance and the remaining term, the same way a
+lender re-amortizes. Each fixed-rate segment is then jumped over in closed form. Cost grows with the number
+of resets, not months. Rates can carry a leading paths axis, so thousands of rate paths are one set of
+NumPy operations. montecarlo.simulate uses this for random resets.
+"""
+import numpy as np
+
+from amortization import annuity_balance, as_scalar, pmt_array
+
+
+def arm_rate_path(initial_rate, reset_rates, fixed_months=60, reset_every=12, periodic_cap=None, lifetime_cap=None,
+                  floor=0.0):
+    """
+    Builds the segments of an ARM, e.g. a 5/1 ARM is fixed_months=60, reset_every=12.
+    :param initial_rate: rate during the fixed period (in %)
+    :param reset_rates: uncapped rate at each reset (in %), shaped (n_resets,) or (n_paths, n_resets)
+    :param fixed_months: length of the initial fixed-rate period (in months)
+    :param reset_every: months between resets
+    :param periodic_cap: largest move at a single reset (in % points)
+    :param lifetime_cap: largest rise above the initial rate over the loan's life (in % points)
+    :param floor: lowest allowed rate (in %)
+    :return: (segment_starts, segment_rates); starts are month offsets, rates have the same leading shape as reset_rates
+    """
+    reset_rates = np.asarray(reset_rates, dtype=float)
+    n_resets = reset_rates.shape[-1]
+    initial = np.broadcast_to(np.asarray(initial_rate, dtype=float), reset_rates.shape[:-1])
+    rates = [initial]
+    for reset in range(n_resets):
+        rate = reset_rates[..., reset]
+        if periodic_cap is not None:
+            rate = np.clip(rate, rates[-1] - periodic_cap, rates[-1] + periodic_cap)
+        if lifetime_cap is not None:
+            rate = np.minimum(rate, initial + lifetime_cap)
+        rates.append(np.maximum(rate, floor))
+    segment_starts = np.concatenate(([0], fixed_months + reset_every * np.arange(n_resets)))
+    return segment_starts, np.stack(rates, axis=-1)
+
+
+def segment_totals(segment_starts, segment_rates, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+    """
+    Cumulative totals of a loan whose rate changes at the given months, evaluated one segment at a time in closed form.
+    :param segment_starts: increasing month offsets at which each segment starts, the first being 0
+    :param segment_rates: annual rate of each segment (in %), shaped (..., n_segments) to evaluate many paths at once
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param tenor: (in months)
+    :return: dict with cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, initial_monthly_payment,
+             monthly_payment (the one in force at redemption), hoa_paid and maintenance_paid
+    """
+    segment_starts = np.asarray(segment_starts)
+    segment_rates = np.asarray(segment_rates, dtype=float)
+    months = min(max(int(redemption_month), 0), tenor)
+    balance = np.broadcast_to(np.asarray(loan_amount, dtype=float), segment_rates.shape[:-1]).copy()
+    total_paid = np.zeros_like(balance)
+    payments = []
+
+    for index, start in enumerate(segment_starts):
+        end = segment_starts[index + 1] if index + 1 < len(segment_starts) else tenor
+        if start >= months:
+            break
+        monthly_interest = segment_rates[..., index] / 12 / 100
+        # Re-amortize what is left over the remaining term
+        payment = pmt_array(monthly_interest, max(tenor - start, 1), -balance)
+        paid_months = min(end, months) - start
+        total_paid += payment * paid_months
+        balance = annuity_balance(monthly_interest, balance, payment, paid_months)
+        payments.append(payment)
+
+    outstanding_principal = np.zeros_like(balance) if months >= tenor else np.maximum(balance, 0.0)
+    cumulative_principal_paid = loan_amount - outstanding_principal
+    first_payment = pmt_array(segment_rates[..., 0] / 12 / 100, tenor, -np.asarray(loan_amount, dtype=float))
+    return {
+        'cumulative_interest_paid': as_scalar(total_paid - cumulative_principal_paid),
+        'cumulative_principal_paid': as_scalar(cumulative_principal_paid),
+        'outstanding_principal': as_scalar(outstanding_principal),
+        'initial_monthly_payment': as_scalar(first_payment),
+        'monthly_payment': as_scalar(payments[-1] if payments else first_payment),
+        'hoa_paid': months * hoa,
+        'maintenance_paid': months * yearly_maintenance_cost / 12,
+    }
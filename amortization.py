@@ -0,0 +1,153 @@
+"""
+Closed-form loan math shared by every engine.
+
+common_logic, schedule, lookup_tables, adjustable and montecarlo all build on these helpers, and this module
+imports none of them, so the imports only run one way. Plain numbers are computed with Python floats and
+arrays are broadcast with NumPy.
+"""
+import numpy as np
+
+from profiling import instrument
+
+NUMBERS = (int, float, np.integer)  # np.float64 is a float
+
+
+def pmt(rate, nper, pv, fv=0, when=0):
+    # mimics numpy_financial.pmt function. Plain numbers skip the np.ndim checks, which cost more than the math;
+    # only the array path is instrumented, so scalar calls stay as cheap as they were
+    if not (isinstance(rate, NUMBERS) and isinstance(nper, NUMBERS) and isinstance(pv, NUMBERS)
+            and isinstance(fv, NUMBERS)) and (np.ndim(rate) or np.ndim(nper) or np.ndim(pv) or np.ndim(fv)):
+        return pmt_array(rate, nper, pv, fv, when)
+
+    if rate == 0:
+        return -(pv + fv) / nper
+
+    # Adjust for when payments are made at the beginning of the period
+    if when == 'begin' or when == 1:
+        when = 1
+    else:
+        when = 0
+
+    # Calculate the periodic payment
+    payment = (rate * (pv * (1 + rate) ** nper + fv)) / ((1 + rate * when) * ((1 + rate) ** nper - 1))
+    return -payment
+
+
+@instrument(name='pmt')
+def pmt_array(rate, nper, pv, fv=0, when=0):
+    """Same as pmt, but broadcasts over NumPy arrays (a zero rate is handled element-wise)"""
+    rate, nper, pv, fv = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (rate, nper, pv, fv)))
+    when = 1 if when == 'begin' or when == 1 else 0
+
+    zero_rate = rate == 0
+    safe_rate = np.where(zero_rate, 1.0, rate)
+    growth = (1 + safe_rate) ** nper
+    payment = (safe_rate * (pv * growth + fv)) / ((1 + safe_rate * when) * (growth - 1))
+    return np.where(zero_rate, -(pv + fv) / nper, -payment)
+
+
+def as_scalar(value):
+    """Unwraps 0-d arrays, so scalar inputs give scalar outputs"""
+    if isinstance(value, np.ndarray) and value.ndim == 0:
+        return value[()]
+    return value
+
+
+def all_numbers(*values):
+    """True when every value is a plain number, so a scalar math path can skip NumPy"""
+    # A plain loop: all() over a generator costs more than the checks themselves
+    for value in values:
+        if not isinstance(value, NUMBERS):
+            return False
+    return True
+
+
+def annuity_balance(monthly_interest, loan_amount, monthly_payment, months):
+    """
+    Closed-form balance after `months` payments, L(1+r)^k - P((1+r)^k - 1)/r, with no clamping; see loan_balance
+    :return: NumPy array broadcast over the arguments
+    """
+    monthly_interest = np.asarray(monthly_interest, dtype=float)
+    growth = (1 + monthly_interest) ** months
+    zero_rate = monthly_interest == 0
+    annuity_factor = np.where(zero_rate, months, (growth - 1) / np.where(zero_rate, 1.0, monthly_interest))
+    return loan_amount * growth - monthly_payment * annuity_factor
+
+
+def loan_balance(monthly_interest, loan_amount, monthly_payment, months, tenor):
+    """
+    Outstanding principal after some months, counted the way every engine counts it: no payments are made past
+    the tenor, the balance is zero from the tenor on, and it never goes negative
+    :param monthly_interest: monthly rate (0.005 for 6% a year)
+    :param loan_amount: (in $)
+    :param monthly_payment: installment, as returned by pmt
+    :param months: months held, may be past the tenor
+    :param tenor: (in months)
+    :return: (paying_months, outstanding_principal): the months clamped to [0, tenor] and the balance after them.
+             Plain numbers are computed with math and give plain numbers; arrays are broadcast
+    """
+    if all_numbers(monthly_interest, loan_amount, monthly_payment, months, tenor):
+        paying_months = min(max(months, 0), tenor)
+        if paying_months >= tenor:
+            return paying_months, 0.0
+        if monthly_interest == 0:
+            return paying_months, max(loan_amount - monthly_payment * paying_months, 0.0)
+        growth = (1 + monthly_interest) ** paying_months
+        return paying_months, max(loan_amount * growth - monthly_payment * (growth - 1) / monthly_interest, 0.0)
+
+    paying_months = np.minimum(np.maximum(months, 0), tenor)  # np.clip costs more on small arrays
+    outstanding_principal = annuity_balance(monthly_interest, loan_amount, monthly_payment, paying_months)
+    return paying_months, np.where(paying_months >= tenor, 0.0, np.maximum(outstanding_principal, 0.0))
+
+
+def geometric_sum(rate, periods):
+    """
+    Sum of (1 + rate)^k for k < periods, kept accurate when rate is close to zero
+    :return: NumPy array broadcast over the arguments
+    """
+    rate = np.asarray(rate, dtype=float)
+    periods = np.asarray(periods, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        stable = np.expm1(periods * np.log1p(np.maximum(rate, -0.5))) / rate
+        direct = ((1 + rate) ** periods - 1) / rate
+    return np.where(rate == 0, periods, np.where(rate > -0.5, stable, direct))
+
+
+def cost_averages(metrics, tenor):
+    """
+    The averages get_cost_metrics adds to an amortization table
+    :param metrics: dict of arrays or DataFrame with payment, cumulative_interest_paid, hoa_paid, maintenance_paid
+                    and loan_amt
+    :param tenor: (in months)
+    :return: dict of the added columns, in get_cost_metrics order
+    """
+    payment, cumulative_interest_paid = metrics['payment'], metrics['cumulative_interest_paid']
+    total_interest_and_fees = cumulative_interest_paid + metrics['hoa_paid'] + metrics['maintenance_paid']  # Over the tenor, cost of funds + fees
+    total_fees = metrics['hoa_paid'] + metrics['maintenance_paid']
+    avr_monthly_principal = metrics['loan_amt'] / tenor
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avr_monthly_interest = cumulative_interest_paid / payment  # Over the tenor, monthly cost of funds
+        avr_monthly_fees = total_fees / payment
+        avr_monthly_interest_and_fees = total_interest_and_fees / payment
+    return {
+        'avr_monthly_interest': avr_monthly_interest,
+        'total_interest_and_fees': total_interest_and_fees,
+        'total_fees': total_fees,
+        'avr_monthly_fees': avr_monthly_fees,
+        'avr_monthly_interest_and_fees': avr_monthly_interest_and_fees,
+        'avr_monthly_principal': avr_monthly_principal,
+        'avr_monthly_interest_and_principal': avr_monthly_interest + avr_monthly_principal,
+        'avr_monthly_interest_principal_fees': avr_monthly_interest_and_fees + avr_monthly_principal,
+    }
+
+
+def finish_cost_metrics(metrics, tenor):
+    """
+    Adds the cost_averages to the base columns, then rounds and broadcasts like get_cost_metrics
+    :param metrics: dict of arrays keyed by the amortization_table column names plus loan_amt; updated in place
+    :param tenor: (in months)
+    :return: dict of read-only broadcast arrays, rounded to 2 decimals
+    """
+    metrics.update(cost_averages(metrics, tenor))
+    shape = np.broadcast_shapes(*(np.shape(value) for value in metrics.values()))
+    return {name: np.broadcast_to(np.round(value, 2), shape) for name, value in metrics.items()}
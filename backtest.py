@@ -0,0 +1,145 @@
+"""
+Historical rolling-window backtest of the buy vs rent decision.
+
+Replays the scenario for every start month of a local monthly dataset and every holding period, using
+that month's mortgage rate and the rent and equity paths that followed. The windows are never simulated
+one by one. The loan is closed form (amortization_totals over a start x holding grid). Rent and investment
+totals are differences of prefix sums of the rent index and of the rent index discounted by the cumulative
+product of equity returns, so every window costs O(1).
+
+Unlike the app, the rent here follows the index and is not capped at the installment. Whatever is left
+of the installment after rent is invested each month, and it is withdrawn when the rent is higher.
+
+The dataset is a CSV with one row per month and the columns month (e.g. 1990-01), mortgage_rate (annual %),
+rent_index, equity_return (monthly total return in %) and optionally home_price_index. Without a home
+price index, the scenario's sticker_profit_from_home_sales is used for every window.
+
+    python backtest.py history.csv --holding-years 1 3 5 10
+"""
+import argparse
+import csv
+
+import numpy as np
+
+from common_logic import DEFAULT_SCENARIO, amortization_totals
+
+SERIES_COLUMNS = ('mortgage_rate', 'rent_index', 'equity_return')
+OPTIONAL_COLUMNS = ('home_price_index',)
+
+
+def load_series(path):
+    """
+    Reads a monthly history CSV
+    :return: dict with 'month' (list of labels) and a float array per series column present
+    """
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path} has no rows")
+    missing = [name for name in ('month',) + SERIES_COLUMNS if name not in rows[0]]
+    if missing:
+        raise ValueError(f"{path} is missing the columns {', '.join(missing)}")
+    series = {'month': [row['month'] for row in rows]}
+    for name in SERIES_COLUMNS + OPTIONAL_COLUMNS:
+        if name in rows[0]:
+            series[name] = np.array([float(row[name]) for row in rows])
+    return series
+
+
+def backtest(series, scenario, max_holding_months=None):
+    """
+    Buy minus rent net position for every (start month, holding period) window that fits in the data
+    :param series: dict as returned by load_series
+    :param scenario: dict of buy_vs_rent keyword arguments; interest_rate, inflation, annual_returns and
+                     redemption_month are ignored, the history supplies them
+    :param max_holding_months: longest holding period, defaults to the tenor
+    :return: dict with start (month labels), holding_months (1..H), and (start, holding) arrays buy_net_position,
+             rent_net_position and net_position, NaN where a window runs past the data
+    """
+    n_months = len(series['month'])
+    tenor = int(scenario.get('tenor', 360))
+    holding = np.arange(1, int(max_holding_months or tenor) + 1)
+    start = np.arange(n_months)[:, np.newaxis]
+    end = start + holding
+    fits = end <= n_months
+    end = np.minimum(end, n_months)
+
+    # Buy side: a fixed-rate loan at the rate of the start month
+    rates = series['mortgage_rate'][:, np.newaxis]
+    cumulative_interest_paid, cumulative_principal_paid, _, monthly_payment, hoa_paid, maintenance_paid = amortization_totals(
+        rates, scenario['loan_amount'], holding, scenario['hoa'], scenario['yearly_maintenance_cost'], tenor)
+    if 'home_price_index' in series:
+        home_price_index = series['home_price_index']
+        price = scenario['loan_amount'] + scenario['initial_deposit']
+        sale_profit = price * (home_price_index[end - 1] / home_price_index[start] - 1)
+    else:
+        sale_profit = scenario['sticker_profit_from_home_sales']
+    buy_net_position = sale_profit + cumulative_principal_paid - cumulative_interest_paid - hoa_paid - maintenance_paid
+
+    # Rent side. Month t of a window starting at s pays rent * index[t] / index[s] and invests the rest of
+    # the installment at the end of the month, like investment_calculator. With growth[k] the value of $1
+    # invested before month 0 after month k-1, the balance is growth[end] times prefix-sum differences.
+    rent_index = series['rent_index']
+    growth = np.concatenate(([1.0], np.cumprod(1 + series['equity_return'] / 100)))
+    rent_prefix = np.concatenate(([0.0], np.cumsum(rent_index)))
+    discount_prefix = np.concatenate(([0.0], np.cumsum(1 / growth[1:])))
+    discounted_rent_prefix = np.concatenate(([0.0], np.cumsum(rent_index / growth[1:])))
+
+    rent_scale = scenario['monthly_rent'] / rent_index[start]
+    total_rent_paid = rent_scale * (rent_prefix[end] - rent_prefix[start])
+    final_balance = growth[end] * (scenario['initial_deposit'] / growth[start]
+                                   + monthly_payment * (discount_prefix[end] - discount_prefix[start])
+                                   - rent_scale * (discounted_rent_prefix[end] - discounted_rent_prefix[start]))
+    rent_net_position = final_balance - total_rent_paid
+
+    def windows(values):
+        return np.where(fits, values, np.nan)
+
+    return {
+        'start': series['month'],
+        'holding_months': holding,
+        'buy_net_position': windows(buy_net_position),
+        'rent_net_position': windows(rent_net_position),
+        'net_position': windows(buy_net_position - rent_net_position),
+    }
+
+
+def win_rates(result, holding_years=(1, 3, 5, 10, 15, 20, 30)):
+    """
+    Share of start months in each calendar year for which buying beat (or tied) renting
+    :param result: dict returned by backtest
+    :param holding_years: holding periods to report (in years)
+    :return: pandas DataFrame indexed by start year with one column per holding period; NaN where no window fits
+    """
+    import pandas as pd  # Imported lazily, like in common_logic
+
+    years = np.array([int(label[:4]) for label in result['start']])
+    holding_years = [years_held for years_held in holding_years if years_held * 12 <= len(result['holding_months'])]
+    columns = {}
+    for years_held in holding_years:
+        net_position = result['net_position'][:, years_held * 12 - 1]
+        complete = ~np.isnan(net_position)
+        buy_wins = pd.Series(np.where(complete, net_position >= 0, np.nan), index=years)
+        columns[f"{years_held}y"] = buy_wins.groupby(level=0).mean()
+    return pd.DataFrame(columns).rename_axis("start_year")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling-window backtest of buying vs renting over a monthly history.")
+    parser.add_argument('history', help="CSV with columns month, " + ', '.join(SERIES_COLUMNS + OPTIONAL_COLUMNS))
+    parser.add_argument('--holding-years', type=int, nargs='+', default=[1, 3, 5, 10, 15, 20, 30])
+    for key in ('loan_amount', 'initial_deposit', 'hoa', 'yearly_maintenance_cost', 'monthly_rent',
+                'sticker_profit_from_home_sales'):
+        parser.add_argument('--' + key.replace('_', '-'), type=float, default=DEFAULT_SCENARIO[key])
+    parser.add_argument('--year-tenor', type=int, default=DEFAULT_SCENARIO['year_tenor'])
+    args = parser.parse_args(argv)
+
+    scenario = {key: getattr(args, key) for key in ('loan_amount', 'initial_deposit', 'hoa', 'yearly_maintenance_cost',
+                                                  'monthly_rent', 'sticker_profit_from_home_sales')}
+    scenario['tenor'] = args.year_tenor * 12
+    table = win_rates(backtest(load_series(args.history), scenario), args.holding_years)
+    print((table * 100).round(0).to_string(na_rep='-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+"""
+Benchmark and differential-correctness suite for the calculators.
+
+    python benchmarks.py                  # time everything, append to the history and flag regressions
+    python benchmarks.py --check          # randomized differential checks against the loop implementations
+    python benchmarks.py --quick --check  # both, with fewer sizes and cases
+
+Timings are appended to a JSON history file. A benchmark is flagged when it runs slower than the best
+earlier timing of the same benchmark by more than the threshold. The differential checks draw random
+scenarios and compare every fast engine with a month-by-month reference loop, kept in common_logic or here
+for the engines built on top of it, and the sensitivities with finite differences of buy_vs_rent.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+import adjustable
+import backtest
+import common_logic
+import events
+import export
+import listings
+import sensitivities
+from amortization import finish_cost_metrics
+from schedule import TABLE_COLUMNS
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_history.json')
+HORIZONS = (12, 60, 120, 360, 600)
+BATCH_SIZES = (1, 100, 10000, 100000)
+RELATIVE_TOLERANCE = 1e-6
+# Central differences of buy_vs_rent are only this accurate
+DERIVATIVE_TOLERANCE = 1e-4
+
+
+def _time(function, min_time=0.05, repeat=5):
+    # Best time per call in seconds, with enough calls per repeat to beat timer noise
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _benchmarks(horizons, batch_sizes):
+    # Yields (name, zero-argument callable) pairs
+    yield 'pmt', lambda: common_logic.pmt(7 / 12 / 100, 360, -1100000)
+    yield 'produce_break_even_table', lambda: common_logic.produce_break_even_table(7, 360, 200, 15000)
+    for months in horizons:
+        tenor = max(months, 360)
+        yield (f'amortization_calculator[{months}]',
+               lambda months=months, tenor=tenor: common_logic.amortization_calculator(7, 1100000, months, 200, 1200, tenor))
+        yield (f'amortization_calculator_loop[{months}]',
+               lambda months=months, tenor=tenor: common_logic.amortization_calculator(7, 1100000, months, 200, 1200, tenor,
+                                                                                       method='loop'))
+        yield (f'rent_calculator[{months}]',
+               lambda months=months: common_logic.rent_calculator(3100, 5, months, comparative_mthly_installment=7300))
+        yield (f'investment_calculator[{months}]',
+               lambda months=months: common_logic.investment_calculator(200000, 4200, 5, months, -5))
+        yield (f'rent_calculator_loop[{months}]',
+               lambda months=months: common_logic.rent_calculator(3100, 5, months, comparative_mthly_installment=7300,
+                                                                  method='loop'))
+        yield (f'investment_calculator_loop[{months}]',
+               lambda months=months: common_logic.investment_calculator(200000, 4200, 5, months, -5, method='loop'))
+        yield (f'amortization_table[{months}]',
+               lambda months=months, tenor=tenor: common_logic.amortization_table(7, 1100000, months, 200, 1200, tenor))
+        yield (f'get_cost_metrics[{months}]',
+               lambda months=months, tenor=tenor: common_logic.get_cost_metrics(7, 1100000, months, 200, 1200, tenor))
+    rng = np.random.default_rng(0)
+    for size in batch_sizes:
+        rates, loans = rng.uniform(1, 12, size), rng.uniform(1e5, 2e6, size)
+        months = rng.integers(1, 361, size)
+        yield (f'amortization_totals[batch={size}]',
+               lambda rates=rates, loans=loans, months=months: common_logic.amortization_totals(rates, loans, months, 200, 1200))
+        yield (f'buy_vs_rent[batch={size}]',
+               lambda rates=rates, loans=loans, months=months: common_logic.buy_vs_rent(
+                   rates, loans, months, 200, 1200, 140000, 3100, 5, 200000, 5))
+        yield (f'cost_metrics_grid[batch={size}]',
+               lambda rates=rates, loans=loans: common_logic.cost_metrics_grid(rates, loans, 360, 200, 1200))
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(horizons=HORIZONS, batch_sizes=BATCH_SIZES, history_path=HISTORY_PATH, threshold=1.25):
+    """
+    Times every benchmark, appends the run to the history file and compares against earlier runs
+    :param horizons: redemption months to time the per-scenario calculators at
+    :param batch_sizes: scenario counts to time the batched engines at
+    :param history_path: JSON history file
+    :param threshold: slowdown ratio versus the best earlier timing that counts as a regression
+    :return: (timings, regressions) where regressions maps name -> (seconds, best earlier seconds)
+    """
+    timings = {}
+    for name, function in _benchmarks(horizons, batch_sizes):
+        timings[name] = _time(function)
+        print(f"{name:45s} {timings[name] * 1e6:12.1f} us")
+
+    history = []
+    if os.path.exists(history_path):
+        with open(history_path) as f:
+            history = json.load(f)
+    regressions = {}
+    for name, seconds in timings.items():
+        earlier = [run['timings'][name] for run in history if name in run['timings']]
+        if earlier and seconds > threshold * min(earlier):
+            regressions[name] = (seconds, min(earlier))
+
+    history.append({
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'timings': timings,
+    })
+    with open(history_path, 'w') as f:
+        json.dump(history, f, indent=1)
+
+    for name, (seconds, best) in regressions.items():
+        print(f"REGRESSION {name}: {seconds * 1e6:.1f} us vs best {best * 1e6:.1f} us ({seconds / best:.2f}x)")
+    return timings, regressions
+
+
+def _close(expected, actual, tolerance=RELATIVE_TOLERANCE):
+    return all(abs(e - a) <= tolerance * max(1.0, abs(e)) for e, a in zip(expected, actual))
+
+
+def _random_loan(rng):
+    # Includes zero loans and holding past the tenor, where the reference loops stray from the intended values
+    tenor = rng.choice([120, 180, 240, 360, 480])
+    return (rng.choice([0.0, rng.uniform(0, 20)]), 0.0 if rng.random() < 0.1 else rng.uniform(0, 3e6),
+            rng.randint(0, tenor + 60), rng.uniform(0, 1000), rng.uniform(0, 30000), tenor)
+
+
+def _intended_totals(loan):
+    # amortization_calculator's loop, except where it strays from the documented behavior: past the tenor it pays
+    # one more installment and month of fees, and on a zero loan it stops charging fees after the first month
+    interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor = loan
+    months = min(max(redemption_month, 0), tenor)
+    if loan_amount == 0:
+        return 0.0, 0.0, 0.0, 0.0, months * hoa, months * yearly_maintenance_cost / 12
+    totals = list(common_logic.amortization_calculator(interest_rate, loan_amount, months, hoa, yearly_maintenance_cost,
+                                                       tenor, method='loop'))
+    if months == tenor:
+        totals[2] = 0.0  # Paid off at the tenor; the loop leaves float noise
+    return totals
+
+
+def _intended_table(loan):
+    # amortization_table's loop with the same two corrections; the table stops one month short of the redemption
+    interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor = loan
+    if loan_amount == 0:
+        return [[payment, (payment - 1) // 12 + 1, payment % 12, 0.0, 0.0, 0.0, 0.0, payment * hoa,
+                 payment * yearly_maintenance_cost / 12] for payment in range(1, min(redemption_month - 1, tenor) + 1)]
+    table = common_logic.amortization_table(interest_rate, loan_amount, min(redemption_month, tenor + 1), hoa,
+                                            yearly_maintenance_cost, tenor, method='loop')
+    for row in table:
+        if row[0] == tenor:
+            row[6] = 0.0  # Paid off at the tenor; the loop leaves float noise
+    return table
+
+
+def _intended_cost_metrics(loan):
+    # Last get_cost_metrics row as a dict, or None when the table is empty
+    interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor = loan
+    if loan_amount == 0:
+        table = _intended_table(loan)
+        if not table:
+            return None
+        base = dict(zip(TABLE_COLUMNS, table[-1]), loan_amt=loan_amount)
+        metrics = finish_cost_metrics({name: np.asarray(value, dtype=float) for name, value in base.items()},
+                                                    tenor)
+        return {name: float(value) for name, value in metrics.items()}
+    metrics = common_logic.get_cost_metrics(interest_rate, loan_amount, min(redemption_month, tenor + 1), hoa,
+                                            yearly_maintenance_cost, tenor, method='loop')
+    return metrics.iloc[0].to_dict() if len(metrics) else None
+
+
+SCENARIO_ARGUMENTS = ('interest_rate', 'loan_amount', 'redemption_month', 'hoa', 'yearly_maintenance_cost',
+                      'sticker_profit_from_home_sales', 'monthly_rent', 'inflation', 'initial_deposit', 'annual_returns',
+                      'tenor')
+
+
+def _random_scenario(rng):
+    # buy_vs_rent arguments, held for at least one month
+    interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor = _random_loan(rng)
+    return (interest_rate, loan_amount, max(redemption_month, 1), hoa, yearly_maintenance_cost, rng.uniform(-2e5, 5e5),
+            rng.uniform(0, 10000), rng.uniform(-10, 15), rng.uniform(0, 1e6), rng.uniform(-10, 20), tenor)
+
+
+def _buy_vs_rent_reference(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                           sticker_profit_from_home_sales, monthly_rent, inflation, initial_deposit, annual_returns, tenor):
+    # buy_vs_rent assembled from the reference loops
+    cumulative_interest_paid, _, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid = _intended_totals(
+        (interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor))
+    total_rent_paid, average_monthly_rent, final_monthly_rent = common_logic.rent_calculator(
+        monthly_rent, inflation, redemption_month, comparative_mthly_installment=monthly_payment, method='loop')
+    total_savings_invested, total_investment_gains, final_balance = common_logic.investment_calculator(
+        initial_deposit, monthly_payment - monthly_rent, annual_returns, redemption_month, -inflation, method='loop')
+    buy_net_position = (sticker_profit_from_home_sales + loan_amount - outstanding_principal - cumulative_interest_paid
+                        - hoa_paid - maintenance_paid)
+    return {
+        'cumulative_interest_paid': cumulative_interest_paid,
+        'cumulative_principal_paid': loan_amount - outstanding_principal,
+        'outstanding_principal': outstanding_principal,
+        'monthly_payment': monthly_payment,
+        'hoa_paid': hoa_paid,
+        'maintenance_paid': maintenance_paid,
+        'total_rent_paid': total_rent_paid,
+        'average_monthly_rent': average_monthly_rent,
+        'final_monthly_rent': final_monthly_rent,
+        'total_savings_invested': total_savings_invested,
+        'total_investment_gains': total_investment_gains,
+        'final_balance': final_balance,
+        'buy_net_position': buy_net_position,
+        'rent_net_position': final_balance - total_rent_paid,
+        'net_position': buy_net_position - (final_balance - total_rent_paid),
+    }
+
+
+def _segment_loop(segment_starts, segment_rates, loan_amount, redemption_month, tenor):
+    # Month-by-month reference for adjustable.segment_totals: re-amortizes at the start of every segment
+    balance = loan_amount
+    cumulative_interest_paid = 0.0
+    monthly_payment = common_logic.pmt(segment_rates[0] / 12 / 100, tenor, -loan_amount)
+    for month in range(min(redemption_month, tenor)):
+        segment = max(index for index, start in enumerate(segment_starts) if start <= month)
+        monthly_interest = segment_rates[segment] / 12 / 100
+        if month == segment_starts[segment]:
+            monthly_payment = common_logic.pmt(monthly_interest, tenor - month, -balance)
+        interest_payment = balance * monthly_interest
+        cumulative_interest_paid += interest_payment
+        balance -= monthly_payment - interest_payment
+    outstanding_principal = max(balance, 0.0) if redemption_month < tenor else 0.0
+    return cumulative_interest_paid, loan_amount - outstanding_principal, outstanding_principal, monthly_payment
+
+
+def _events_loop(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor, loan_events):
+    # Month-by-month reference for events.event_totals
+    monthly_interest = interest_rate / 12 / 100
+    monthly_payment = common_logic.pmt(monthly_interest, tenor, -loan_amount)
+    balance = borrowed = loan_amount
+    total_paid = closing_costs_paid = 0.0
+    loan_end = tenor
+    for month in range(1, redemption_month + 1):
+        if balance > 1e-9 and month <= loan_end:
+            outflow = monthly_payment + sum(event.amount for event in loan_events if isinstance(event, events.ExtraPrincipal)
+                                            and event.start_month <= month
+                                            and (event.end_month is None or event.end_month >= month))
+            due = balance * (1 + monthly_interest)
+            paid = due if outflow >= due - 1e-9 else outflow  # The final payment only clears what is left
+            total_paid += paid
+            balance = due - paid
+        for event in loan_events:
+            if isinstance(event, events.LumpSum) and event.month == month and balance > 0:
+                amount = min(event.amount, balance)
+                balance -= amount
+                total_paid += amount
+        for event in loan_events:
+            if isinstance(event, events.Refinance) and event.month == month and balance > 0:
+                if event.roll_costs:
+                    balance += event.closing_costs
+                    borrowed += event.closing_costs
+                else:
+                    closing_costs_paid += event.closing_costs
+                monthly_interest = event.interest_rate / 12 / 100
+                monthly_payment = common_logic.pmt(monthly_interest, event.tenor, -balance)
+                loan_end = month + event.tenor
+    owned_months = min(redemption_month, tenor)
+    return (total_paid - (borrowed - balance), borrowed - balance, balance, closing_costs_paid, owned_months * hoa,
+            owned_months * yearly_maintenance_cost / 12)
+
+
+def _random_events(rng, loan_amount, tenor):
+    loan_events = []
+    if rng.random() < 0.6:
+        loan_events.append(events.LumpSum(rng.randint(1, tenor), rng.uniform(0, loan_amount / 3)))
+    if rng.random() < 0.6:
+        loan_events.append(events.ExtraPrincipal(rng.randint(1, tenor), rng.uniform(0, 3000),
+                                                 rng.choice([None, rng.randint(1, tenor)])))
+    if rng.random() < 0.6:
+        loan_events.append(events.Refinance(rng.randint(1, tenor), rng.uniform(0, 9), rng.choice([60, 120, 360]),
+                                            rng.uniform(0, 10000), rng.random() < 0.5))
+    return loan_events
+
+
+def _random_history(rng, n_months):
+    # Synthetic monthly history in the backtest.load_series format
+    series = {'month': [f"{2000 + month // 12}-{month % 12 + 1:02d}" for month in range(n_months)],
+              'mortgage_rate': np.array([rng.uniform(0, 12) for _ in range(n_months)]),
+              'rent_index': np.cumprod([1 + rng.uniform(-0.01, 0.02) for _ in range(n_months)]),
+              'equity_return': np.array([rng.gauss(0.7, 4) for _ in range(n_months)])}
+    if rng.random() < 0.5:
+        series['home_price_index'] = np.cumprod([1 + rng.uniform(-0.02, 0.03) for _ in range(n_months)])
+    return series
+
+
+def _backtest_window(series, scenario, start, holding_months):
+    # Month-by-month reference for one backtest window: (buy_net_position, rent_net_position)
+    loan = (series['mortgage_rate'][start], scenario['loan_amount'], holding_months, scenario['hoa'],
+            scenario['yearly_maintenance_cost'], scenario['tenor'])
+    cumulative_interest_paid, _, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid = _intended_totals(loan)
+    sale_profit = scenario['sticker_profit_from_home_sales']
+    if 'home_price_index' in series:
+        price_growth = series['home_price_index'][start + holding_months - 1] / series['home_price_index'][start]
+        sale_profit = (scenario['loan_amount'] + scenario['initial_deposit']) * (price_growth - 1)
+    buy_net_position = (sale_profit + scenario['loan_amount'] - outstanding_principal - cumulative_interest_paid
+                        - hoa_paid - maintenance_paid)
+
+    balance, total_rent_paid = scenario['initial_deposit'], 0.0
+    for month in range(start, start + holding_months):
+        rent = scenario['monthly_rent'] * series['rent_index'][month] / series['rent_index'][start]
+        total_rent_paid += rent
+        balance = balance * (1 + series['equity_return'][month] / 100) + monthly_payment - rent
+    return buy_net_position, balance - total_rent_paid
+
+
+def run_differential_checks(n_cases=2000, seed=0):
+    """
+    Compares the fast engines with the reference loops on random scenarios
+    :param n_cases: random scenarios per engine
+    :param seed: seed for the scenario generator
+    :return: list of failure descriptions (empty when everything matches)
+    """
+    rng = random.Random(seed)
+    failures = []
+
+    def check(name, arguments, expected, actual, tolerance=RELATIVE_TOLERANCE):
+        if not _close(expected, actual, tolerance):
+            failures.append(f"{name}{arguments}: expected {expected}, got {actual}")
+
+    for _ in range(n_cases):
+        loan = _random_loan(rng)
+        intended = _intended_totals(loan)
+        check('amortization_calculator', loan, intended, common_logic.amortization_calculator(*loan))
+        # Plain numbers take the scalar math path; the NumPy engine must agree with it
+        check('amortization_totals', loan, intended, common_logic.amortization_totals(*(np.asarray(value) for value in loan)))
+
+        rent = (rng.uniform(0, 10000), rng.uniform(-10, 15), rng.randint(1, 720), rng.choice([None, 0, rng.uniform(0, 10000)]))
+        expected = common_logic.rent_calculator(*rent, method='loop')
+        check('rent_calculator', rent, expected, common_logic.rent_calculator(*rent))
+        check('rent_totals', rent, expected, common_logic.rent_totals(*(np.asarray(value) for value in rent[:3]), rent[3]))
+
+        investment = (rng.uniform(0, 1e6), rng.uniform(-5000, 10000), rng.uniform(-10, 20), rng.randint(0, 720),
+                      rng.uniform(-20, 20))
+        expected = common_logic.investment_calculator(*investment, method='loop')
+        check('investment_calculator', investment, expected, common_logic.investment_calculator(*investment))
+        check('investment_totals', investment, expected,
+              common_logic.investment_totals(*(np.asarray(value) for value in investment)))
+
+    for _ in range(max(1, n_cases // 20)):
+        loan = _random_loan(rng)
+        expected, actual = _intended_table(loan), common_logic.amortization_table(*loan)
+        if len(expected) != len(actual):
+            failures.append(f"amortization_table{loan}: expected {len(expected)} rows, got {len(actual)}")
+            continue
+        for expected_row, actual_row in zip(expected, actual):
+            check('amortization_table', loan, expected_row, actual_row)
+
+        metrics = _intended_cost_metrics(loan)
+        if metrics is not None:
+            columns = common_logic.get_cost_metrics(*loan).iloc[0]
+            grid = common_logic.cost_metrics_grid(*loan)
+            expected = [metrics[column] for column in columns.index]
+            check('cost_metrics_grid', loan, expected, [float(grid[column]) for column in columns.index])
+            check('get_cost_metrics', loan, expected, columns.tolist())
+
+    # The projection is checked at the redemption month and, through its time series, at a few earlier months
+    series_columns = {'cumulative_interest_paid': 'cumulative_interest_paid', 'outstanding_principal': 'outstanding_principal',
+                      'hoa_paid': 'hoa_paid', 'maintenance_paid': 'maintenance_paid', 'total_rent_paid': 'total_rent_paid',
+                      'total_savings_invested': 'total_savings_invested', 'final_balance': 'investment_balance',
+                      'buy_net_position': 'buy_net_position', 'rent_net_position': 'rent_net_position'}
+    for _ in range(max(1, n_cases // 20)):
+        scenario = _random_scenario(rng)
+        series, summary, _ = common_logic.monthly_projection(*scenario)
+        expected = _buy_vs_rent_reference(*scenario)
+        check('monthly_projection', scenario, list(expected.values()), [summary[name] for name in expected])
+        for month in {1, rng.randint(1, scenario[2]), scenario[2]}:
+            at_month = scenario[:2] + (month,) + scenario[3:]
+            expected = _buy_vs_rent_reference(*at_month)
+            check('monthly_projection series', at_month, [expected[name] for name in series_columns],
+                  [series[column][month - 1] for column in series_columns.values()])
+
+    for _ in range(max(1, n_cases // 20)):
+        tenor = rng.choice([180, 360])
+        arm = dict(initial_rate=rng.uniform(0, 10), reset_rates=[rng.uniform(0, 12) for _ in range(10)],
+                   fixed_months=rng.choice([36, 60, 84]), reset_every=rng.choice([6, 12]),
+                   periodic_cap=rng.choice([None, 2.0]), lifetime_cap=rng.choice([None, 5.0]))
+        loan_amount, redemption_month = rng.uniform(0, 2e6), rng.randint(0, tenor + 60)
+        segment_starts, segment_rates = adjustable.arm_rate_path(**arm)
+        totals = adjustable.segment_totals(segment_starts, segment_rates, loan_amount, redemption_month, 0, 0, tenor)
+        check('segment_totals', (arm, loan_amount, redemption_month, tenor),
+              _segment_loop(segment_starts.tolist(), segment_rates.tolist(), loan_amount, redemption_month, tenor),
+              [totals[name] for name in ('cumulative_interest_paid', 'cumulative_principal_paid', 'outstanding_principal',
+                                         'monthly_payment')])
+
+    for _ in range(max(1, n_cases // 20)):
+        interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor = _random_loan(rng)
+        loan = (interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor)
+        loan_events = _random_events(rng, loan_amount, tenor)
+        totals = events.event_totals(*loan, loan_events)
+        check('event_totals', loan + (loan_events,), _events_loop(*loan, loan_events),
+              [totals[name] for name in ('cumulative_interest_paid', 'cumulative_principal_paid', 'outstanding_principal',
+                                         'closing_costs_paid', 'hoa_paid', 'maintenance_paid')])
+
+    for _ in range(max(1, n_cases // 100)):
+        series = _random_history(rng, rng.randint(24, 120))
+        scenario = {'loan_amount': rng.uniform(0, 2e6), 'initial_deposit': rng.uniform(0, 5e5), 'hoa': rng.uniform(0, 1000),
+                    'yearly_maintenance_cost': rng.uniform(0, 30000), 'monthly_rent': rng.uniform(100, 10000),
+                    'sticker_profit_from_home_sales': rng.uniform(-2e5, 5e5), 'tenor': rng.choice([36, 120, 360])}
+        result = backtest.backtest(series, scenario, max_holding_months=rng.randint(1, 60))
+        n_months, max_holding = len(series['month']), len(result['holding_months'])
+        for _ in range(10):
+            start, holding_months = rng.randrange(n_months), rng.randint(1, max_holding)
+            actual = [result[name][start, holding_months - 1] for name in ('buy_net_position', 'rent_net_position')]
+            if start + holding_months > n_months:
+                if not np.isnan(actual).all():
+                    failures.append(f"backtest{(start, holding_months)}: expected NaN past the data, got {actual}")
+                continue
+            check('backtest', (scenario, start, holding_months), _backtest_window(series, scenario, start, holding_months),
+                  actual)
+
+    # Sweep axes as breakeven_app builds them from its sliders; the slider values are multiples of 1/16, which
+    # are exact in binary, so the intended axis is known exactly and must end at the stop when the stop is on it
+    for _ in range(max(1, n_cases // 20)):
+        loan_axis = sorted(rng.randrange(0, 5000001, 10000) for _ in range(2)) + [rng.randrange(100, 100001, 100)]
+        rate_axis = sorted(rng.randrange(0, 161) * 0.125 for _ in range(2)) + [rng.randrange(1, 65) * 0.0625]
+        for start, stop, step in (loan_axis, rate_axis):
+            expected = [start + k * step for k in range(int((stop - start) // step) + 1)]
+            actual = export.steps(start, stop, step)
+            if len(actual) != len(expected) or actual[-1] > stop:
+                failures.append(f"steps{(start, stop, step)}: expected {len(expected)} values up to {expected[-1]}, "
+                                f"got {len(actual)} up to {actual[-1]}")
+                continue
+            check('steps', (start, stop, step), expected, actual.tolist())
+
+    # Listings CSVs with blank lines and a trailing newline: blank lines are skipped, and a blank required value
+    # is reported with its line number
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'listings.csv')
+        with open(path, 'w', newline='') as f:
+            f.write('id,price,down_payment,hoa\n\na,500000,100000,200\n\nb,600000,150000\n\n')
+        expected = [(['a'], [[500000.0], [100000.0], [200.0]]), (['b'], [[600000.0], [150000.0], [0.0]])]
+        try:
+            actual = [(ids, [columns[name].tolist() for name in ('price', 'down_payment', 'hoa')])
+                      for ids, columns in listings.read_listings(path, chunk_size=1)]
+        except ValueError as error:
+            actual = error
+        if actual != expected:
+            failures.append(f"read_listings with blank lines: expected {expected}, got {actual}")
+        with open(path, 'a', newline='') as f:
+            f.write('c,700000,\n')
+        try:
+            list(listings.read_listings(path))
+            failures.append("read_listings with a blank down_payment: expected a ValueError")
+        except ValueError as error:
+            if 'line 7' not in str(error):
+                failures.append(f"read_listings with a blank down_payment: expected line 7 in {str(error)!r}")
+
+    # Values against buy_vs_rent; derivatives against its central differences, except where the rent cap makes
+    # the net positions jump (a zero loan) or kink (a yearly rent within 0.1% of the installment)
+    for _ in range(max(1, n_cases // 40)):
+        scenario = dict(zip(SCENARIO_ARGUMENTS, _random_scenario(rng)))
+        result = sensitivities.sensitivities(**scenario)
+        expected = common_logic.buy_vs_rent(**scenario)
+        check('sensitivities', scenario, [expected[name] for name in sensitivities.OUTPUTS],
+              [result[name] for name in sensitivities.OUTPUTS])
+        held_longer = common_logic.buy_vs_rent(**{**scenario, 'redemption_month': scenario['redemption_month'] + 1})
+        check('sensitivities redemption_month', scenario, [held_longer[name] - expected[name] for name in sensitivities.OUTPUTS],
+              [result['derivatives'][name]['redemption_month'] for name in sensitivities.OUTPUTS])
+        years = np.arange(math.ceil(scenario['redemption_month'] / 12))
+        yearly_rents = scenario['monthly_rent'] * (1 + scenario['inflation'] / 100) ** years
+        if scenario['loan_amount'] == 0 or np.isclose(yearly_rents, expected['monthly_payment'], rtol=1e-3).any():
+            continue
+        for argument in sensitivities.INPUTS:
+            step = 1e-4 * max(1.0, abs(scenario[argument]))
+            up = common_logic.buy_vs_rent(**{**scenario, argument: scenario[argument] + step})
+            down = common_logic.buy_vs_rent(**{**scenario, argument: scenario[argument] - step})
+            check(f'sensitivities {argument}', scenario, [(up[name] - down[name]) / (2 * step) for name in sensitivities.OUTPUTS],
+                  [result['derivatives'][name][argument] for name in sensitivities.OUTPUTS], DERIVATIVE_TOLERANCE)
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark and differential-correctness suite for the calculators.")
+    parser.add_argument('--check', action='store_true', help="run the randomized differential checks")
+    parser.add_argument('--no-bench', action='store_true', help="skip the timings")
+    parser.add_argument('--quick', action='store_true', help="fewer horizons, batch sizes and random cases")
+    parser.add_argument('--history', default=HISTORY_PATH, help="JSON file the timings are appended to")
+    parser.add_argument('--threshold', type=float, default=1.25, help="slowdown ratio flagged as a regression")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the differential checks")
+    args = parser.parse_args(argv)
+
+    failed = False
+    if args.check:
+        failures = run_differential_checks(200 if args.quick else 2000, args.seed)
+        for failure in failures[:20]:
+            print(f"MISMATCH {failure}")
+        print(f"differential checks: {len(failures)} mismatches")
+        failed |= bool(failures)
+    if not args.no_bench:
+        _, regressions = run_benchmarks((60, 360) if args.quick else HORIZONS,
+                                        (1, 10000) if args.quick else BATCH_SIZES, args.history, args.threshold)
+        failed |= bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,128 +1,14 @@
-import pandas as pd
 import streamlit as st
 import warnings
+from scenario_cache import produce_break_even_table
+import profiling_panel
+import importlib.util
+import os
+import tempfile
+from export import Sweep, export, steps
 
 warnings.filterwarnings("ignore")
-
-
-def pmt(rate, nper, pv, fv=0, when=0):
-    # mimics numpy_financial.pmt function
-    if rate == 0:
-        return -(pv + fv) / nper
-
-    # Adjust for when payments are made at the beginning of the period
-    if when == 'begin' or when == 1:
-        when = 1
-    else:
-        when = 0
-
-    # Calculate the periodic payment
-    payment = (rate * (pv * (1 + rate) ** nper + fv)) / ((1 + rate * when) * ((1 + rate) ** nper - 1))
-    return -payment
-
-
-def amortization_table(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
-    """
-    Creates an amortization table for a loan.
-
-    :param interest_rate: in percentage (8%)
-    :param loan_amount: (in $)
-    :param redemption_month: (# months)
-    :param hoa: monthly HOA fee (in $)
-    :param yearly_maintenance_cost: yearly maintenance cost (in $)
-    :param tenor: (in months)
-    :return: A list of lists representing each row of the amortization table.
-    """
-
-    monthly_interest = interest_rate / 12 / 100
-    monthly_maintenance_cost = yearly_maintenance_cost / 12
-    monthly_payment = pmt(monthly_interest, tenor, -loan_amount)
-
-    amortization_data = []
-    outstanding_principal = loan_amount
-    cumulative_interest_paid = 0
-    cumulative_principal_paid = 0
-    hoa_paid = 0
-    maintenance_paid = 0
-    year = 1
-    month = 0
-    payment = 0
-
-    for payment in range(1, redemption_month):
-        interest_payment = outstanding_principal * monthly_interest
-        principal_payment = monthly_payment - interest_payment
-
-        cumulative_interest_paid += interest_payment
-        cumulative_principal_paid += principal_payment
-        hoa_paid += hoa
-        maintenance_paid += monthly_maintenance_cost
-
-        outstanding_principal -= principal_payment
-        month += 1
-
-        amortization_data.append([
-            payment,
-            year,
-            month % 12,
-            monthly_payment,
-            interest_payment,
-            cumulative_interest_paid,
-            outstanding_principal,
-            hoa_paid,
-            maintenance_paid
-        ])
-
-        if payment % 12 == 0:
-            year += 1
-
-        if outstanding_principal <= 0:
-            break
-
-    return amortization_data
-
-
-def get_cost_metrics(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
-    df = pd.DataFrame(
-        amortization_table(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360),
-        columns=["payment", "year", "month", "monthly_payment", "interest_paid",
-                 "cumulative_interest_paid", "outstanding_principal", "hoa_paid", "maintenance_paid"])
-    df['loan_amt'] = loan_amount
-    df['avr_monthly_interest'] = df['cumulative_interest_paid'] / df['payment']  # Over the tenor, monthly cost of funds
-    df['total_interest_and_fees'] = df['cumulative_interest_paid'] + df['hoa_paid'] + df[
-        'maintenance_paid']  # Over the tenor, cost of funds + fees
-    df['total_fees'] = df['hoa_paid'] + df['maintenance_paid']
-    df['avr_monthly_fees'] = df['total_fees'] / df['payment']
-    df['avr_monthly_interest_and_fees'] = df['total_interest_and_fees'] / df['payment']
-    df['avr_monthly_principal'] = loan_amount / tenor
-    df['avr_monthly_interest_and_principal'] = df['avr_monthly_interest'] + df['avr_monthly_principal']
-    df['avr_monthly_interest_principal_fees'] = df['avr_monthly_interest_and_fees'] + df['avr_monthly_principal']
-    df = df.round(2)
-
-    return df.tail(1)  # Take the last entry as we assume no redemption
-
-
-# the = get_costs(5.6, 1000000, 360, 450, 100, tenor=360)
-
-
-def produce_break_even_table(interest, tenor, hoa, maintenance):
-    df = get_cost_metrics(interest, 100000, tenor, hoa, maintenance, tenor=tenor)
-    new_dfs = []
-    for i in range(110000, 1210000, 10000):
-        new_df = get_cost_metrics(interest, i, tenor, hoa, maintenance, tenor)
-        new_dfs.append(new_df)
-
-    # Concatenate the original DataFrame with the new ones
-    df = pd.concat([df] + new_dfs, ignore_index=True)
-    df2 = df[['loan_amt', 'year',
-              'avr_monthly_interest_and_fees',
-              'avr_monthly_interest_principal_fees',
-              'avr_monthly_principal',
-              'avr_monthly_interest',
-              'avr_monthly_fees',
-              'cumulative_interest_paid',
-              ]]
-
-    return df2
+profile_token = profiling_panel.start('breakeven_app')
 
 
 # Copy starts here:
@@ -157,6 +43,54 @@ st.markdown("""
 # Print the table
 st.dataframe(display_table)
 
+# Larger sweeps are computed page by page and written to file in chunks
+MAX_DOWNLOAD_ROWS = 1000000  # Streamlit holds a download in memory; use `python export.py` beyond this
+with st.expander("Explore and export a larger sweep"):
+    sw_col1, sw_col2 = st.columns(2)
+    with sw_col1:
+        loan_range = st.slider("Loan Amount Range ($)", min_value=0, max_value=5000000, value=(100000, 1200000), step=10000)
+        loan_step = st.number_input("Loan Amount Step ($)", min_value=100, value=1000, step=100)
+        rate_range = st.slider("Interest Rate Range (%)", min_value=0.0, max_value=20.0, value=(interest_rate, interest_rate), step=0.125)
+        rate_step = st.number_input("Interest Rate Step (%)", min_value=0.0625, value=0.125, step=0.0625)
+    with sw_col2:
+        sweep_tenors = st.multiselect("Loan Tenors (years)", [10, 15, 20, 25, 30], default=[year_tenor] if year_tenor in (10, 15, 20, 25, 30) else [30])
+        hoa_levels = st.text_input("Monthly Expenses/HOA Levels ($, comma separated)", value=f"{hoa_fee:g}")
+        maintenance_levels = st.text_input("Annual Expenses Levels ($, comma separated)", value=f"{yearly_maintenance_cost:g}")
+
+    try:
+        sweep = Sweep(steps(loan_range[0], loan_range[1], loan_step), steps(rate_range[0], rate_range[1], rate_step),
+                      [years * 12 for years in sweep_tenors] or [tenor],
+                      [float(level) for level in hoa_levels.split(',') if level.strip()] or [hoa_fee],
+                      [float(level) for level in maintenance_levels.split(',') if level.strip()] or [yearly_maintenance_cost])
+    except ValueError:
+        st.write("Expense levels must be numbers separated by commas.")
+        sweep = None
+
+    if sweep is not None:
+        page_size = 100
+        n_pages = max(-(-len(sweep) // page_size), 1)
+        st.write(f"**{len(sweep):,}** rows")
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1)
+        st.dataframe(sweep.page(page - 1, page_size))
+
+        formats = ['.csv'] + (['.parquet'] if importlib.util.find_spec('pyarrow') else [])
+        file_format = st.radio("File Format", formats, horizontal=True)
+        if len(sweep) > MAX_DOWNLOAD_ROWS:
+            st.write(f"Downloads are limited to {MAX_DOWNLOAD_ROWS:,} rows here. "
+                     f"Use `python export.py` for larger sweeps; it writes any size in bounded memory.")
+        elif st.button("Prepare Download"):
+            previous = st.session_state.pop('sweep_file', None)
+            if previous and os.path.exists(previous):
+                os.remove(previous)
+            handle, path = tempfile.mkstemp(suffix=file_format)
+            os.close(handle)
+            export(sweep, path)
+            st.session_state['sweep_file'] = path
+        path = st.session_state.get('sweep_file')
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                st.download_button("Download Sweep", f, file_name="break_even_sweep" + os.path.splitext(path)[1])
+
 st.markdown("""
     
     If you're interested in selling/flipping, this is not the chart for you. Use [this](https://gzhou-buy-vs-rent.streamlit.app/) instead to project your financial position.
@@ -177,5 +111,4 @@ st.markdown("""
 
     """)
 
-
-
+profiling_panel.finish(profile_token)
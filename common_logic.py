@@ -1,21 +1,35 @@
-def pmt(rate, nper, pv, fv=0, when=0):
-    # mimics numpy_financial.pmt function
-    if rate == 0:
-        return -(pv + fv) / nper
+import argparse
+import csv
+import itertools
+import json
+import math
+import sys
+import time
 
-    # Adjust for when payments are made at the beginning of the period
-    if when == 'begin' or when == 1:
-        when = 1
-    else:
-        when = 0
+import numpy as np
 
-    # Calculate the periodic payment
-    payment = (rate * (pv * (1 + rate) ** nper + fv)) / ((1 + rate * when) * ((1 + rate) ** nper - 1))
-    return -payment
+from amortization import (all_numbers, annuity_balance, as_scalar, cost_averages, finish_cost_metrics, geometric_sum,
+                          loan_balance, pmt, pmt_array)
+from profiling import instrument, profiler
+from schedule import COST_METRICS_COLUMNS, TABLE_COLUMNS, AmortizationSchedule, unit_schedules
 
-def amortization_calculator(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+
+def _geometric_sum_scalar(rate, periods):
+    # geometric_sum for plain numbers
+    if rate == 0:
+        return periods
+    if rate > -0.5:
+        return math.expm1(periods * math.log1p(rate)) / rate
+    return ((1 + rate) ** periods - 1) / rate
+
+
+def amortization_totals(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
     """
-    Calculates the important stats from selling a property
+    Closed-form cumulative totals at the redemption month. Every argument may be a scalar or a NumPy array;
+    arrays are broadcast against each other so thousands of scenarios are evaluated in a single call.
+    Installments and fees stop at the tenor, and a zero loan pays fees for every month held. The reference loop
+    differs there: it can pay one more installment and month of fees past the tenor, and charges a zero loan's
+    fees for the first month only. benchmarks.py checks both cases against these values.
     :param interest_rate: in percentage (8%)
     :param loan_amount: (in $)
     :param redemption_month: (# months)
@@ -24,6 +38,38 @@ def amortization_calculator(interest_rate, loan_amount, redemption_month, hoa, y
     :param tenor: (in months)
     :return: cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid
     """
+    monthly_interest = np.asarray(interest_rate, dtype=float) / 12 / 100
+    loan_amount = np.asarray(loan_amount, dtype=float)
+    monthly_payment = pmt_array(monthly_interest, tenor, -loan_amount)
+
+    months, outstanding_principal = loan_balance(monthly_interest, loan_amount, monthly_payment, redemption_month, tenor)
+
+    cumulative_principal_paid = loan_amount - outstanding_principal
+    cumulative_interest_paid = months * monthly_payment - cumulative_principal_paid
+    hoa_paid = months * np.asarray(hoa, dtype=float)
+    maintenance_paid = months * np.asarray(yearly_maintenance_cost, dtype=float) / 12
+
+    return tuple(as_scalar(value) for value in (cumulative_interest_paid, cumulative_principal_paid, outstanding_principal,
+                                              monthly_payment, hoa_paid, maintenance_paid))
+
+
+def _amortization_totals_scalar(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+    # amortization_totals for plain numbers, with math instead of NumPy: a single scenario costs a couple of
+    # microseconds instead of the array set-up
+    monthly_interest = interest_rate / 12 / 100
+    monthly_payment = pmt(monthly_interest, tenor, -loan_amount)
+
+    months, outstanding_principal = loan_balance(monthly_interest, loan_amount, monthly_payment, redemption_month, tenor)
+
+    cumulative_principal_paid = loan_amount - outstanding_principal
+    cumulative_interest_paid = months * monthly_payment - cumulative_principal_paid
+    return (cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment,
+            months * hoa, months * yearly_maintenance_cost / 12)
+
+
+def _amortization_loop(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+    # Reference month-by-month implementation, kept for verification. It can run one month past the tenor, and stops
+    # after the first month of a zero loan; amortization_totals does neither
     monthly_interest = interest_rate / 12 / 100
     monthly_maintenance_cost = yearly_maintenance_cost / 12
 
@@ -59,6 +105,32 @@ def amortization_calculator(interest_rate, loan_amount, redemption_month, hoa, y
 
     return cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid
 
+
+@instrument
+def amortization_calculator(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360,
+                            method='closed_form'):
+    """
+    Calculates the important stats from selling a property
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param tenor: (in months)
+    :param method: 'closed_form' (default) or 'loop' to run the month-by-month reference implementation
+    :return: cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid
+    """
+    if method == 'loop':
+        return _amortization_loop(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor)
+    if method != 'closed_form':
+        raise ValueError(f"Unknown method {method!r}, expected 'closed_form' or 'loop'")
+
+    # NumPy only pays off once an argument is an array
+    totals = (_amortization_totals_scalar if all_numbers(interest_rate, loan_amount, redemption_month, hoa,
+                                                          yearly_maintenance_cost, tenor) else amortization_totals)
+    return tuple(float(value) for value in totals(interest_rate, loan_amount, redemption_month, hoa,
+                                                  yearly_maintenance_cost, tenor))
+
 # # Property Loan Params:
 # interest = 4  # 8% annual interest
 # loan_amount = 1300000  # $1,400,000 loan
@@ -77,16 +149,245 @@ def amortization_calculator(interest_rate, loan_amount, redemption_month, hoa, y
 # print(f"Maintenance Paid: ${maintenance_paid:.2f}")
 
 
+def _amortization_table_loop(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+    # Reference month-by-month implementation, kept for verification
+    monthly_interest = interest_rate / 12 / 100
+    monthly_maintenance_cost = yearly_maintenance_cost / 12
+    monthly_payment = pmt(monthly_interest, tenor, -loan_amount)
+
+    amortization_data = []
+    outstanding_principal = loan_amount
+    cumulative_interest_paid = 0
+    cumulative_principal_paid = 0
+    hoa_paid = 0
+    maintenance_paid = 0
+    year = 1
+    month = 0
+    payment = 0
+
+    for payment in range(1, redemption_month):
+        interest_payment = outstanding_principal * monthly_interest
+        principal_payment = monthly_payment - interest_payment
+
+        cumulative_interest_paid += interest_payment
+        cumulative_principal_paid += principal_payment
+        hoa_paid += hoa
+        maintenance_paid += monthly_maintenance_cost
+
+        outstanding_principal -= principal_payment
+        month += 1
+
+        amortization_data.append([
+            payment,
+            year,
+            month % 12,
+            monthly_payment,
+            interest_payment,
+            cumulative_interest_paid,
+            outstanding_principal,
+            hoa_paid,
+            maintenance_paid
+        ])
+
+        if payment % 12 == 0:
+            year += 1
 
-def rent_calculator(monthly_rent, inflation, redemption_month, comparative_mthly_installment=None):
+        if outstanding_principal <= 0:
+            break
+
+    return amortization_data
+
+
+def amortization_table(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360,
+                       method='closed_form'):
     """
-    Calculates the total and average monthly rent over a specified period, taking into account yearly inflation and a potential comparative monthly installment
+    Creates an amortization table for a loan.
+
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param tenor: (in months)
+    :param method: 'closed_form' (default) or 'loop' to run the month-by-month reference implementation
+    :return: A list of lists representing each row of the amortization table.
+    """
+    if method == 'loop':
+        return _amortization_table_loop(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor)
+    if method != 'closed_form':
+        raise ValueError(f"Unknown method {method!r}, expected 'closed_form' or 'loop'")
+
+    return AmortizationSchedule.from_table_args(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                                                tenor).to_table()
+
+
+def cost_metrics_grid(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+    """
+    Terminal cost metrics (the last row of get_cost_metrics) computed in closed form. Every argument may be a
+    scalar or a NumPy array and arrays are broadcast against each other, so a whole grid of scenarios is
+    evaluated in one pass without building any schedule.
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param tenor: (in months)
+    :return: dict of arrays keyed by the get_cost_metrics column names, rounded to 2 decimals
+    """
+    monthly_interest = np.asarray(interest_rate, dtype=float) / 12 / 100
+    loan_amount = np.asarray(loan_amount, dtype=float)
+    tenor = np.asarray(tenor)
+    monthly_payment = pmt_array(monthly_interest, tenor, -loan_amount)
+
+    # amortization_table stops one month short of the redemption month
+    payment, outstanding_principal = loan_balance(monthly_interest, loan_amount, monthly_payment,
+                                                  np.asarray(redemption_month) - 1, tenor)
+    previous_principal = annuity_balance(monthly_interest, loan_amount, monthly_payment, payment - 1)
+    cumulative_interest_paid = payment * monthly_payment - (loan_amount - outstanding_principal)
+    hoa_paid = payment * np.asarray(hoa, dtype=float)
+    maintenance_paid = payment * np.asarray(yearly_maintenance_cost, dtype=float) / 12
+
+    metrics = {
+        'payment': payment,
+        'year': (payment - 1) // 12 + 1,
+        'month': payment % 12,
+        'monthly_payment': monthly_payment,
+        'interest_paid': previous_principal * monthly_interest,
+        'cumulative_interest_paid': cumulative_interest_paid,
+        'outstanding_principal': outstanding_principal,
+        'hoa_paid': hoa_paid,
+        'maintenance_paid': maintenance_paid,
+        'loan_amt': loan_amount,
+    }
+    return finish_cost_metrics(metrics, tenor)
+
+
+def break_even_grid(loan_amounts, interest_rates, tenors, hoa, yearly_maintenance_cost):
+    """
+    Evaluates loan amounts x interest rates x tenors as one broadcast computation, assuming the loan is held
+    for its full tenor (as on the break-even page).
+    :param loan_amounts: 1-D sequence of loan amounts (in $)
+    :param interest_rates: 1-D sequence of interest rates (in %)
+    :param tenors: 1-D sequence of tenors (in months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :return: dict of arrays shaped (len(loan_amounts), len(interest_rates), len(tenors))
+    """
+    loans, rates, tenors = np.ix_(np.atleast_1d(np.asarray(loan_amounts, dtype=float)),
+                                  np.atleast_1d(np.asarray(interest_rates, dtype=float)),
+                                  np.atleast_1d(np.asarray(tenors)))
+    return cost_metrics_grid(rates, loans, tenors, hoa, yearly_maintenance_cost, tenor=tenors)
+
+
+@instrument
+def get_cost_metrics(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360, method='closed_form'):
+    if method == 'closed_form':
+        # Only the last row is materialized
+        schedule = AmortizationSchedule.from_table_args(interest_rate, loan_amount, redemption_month, hoa,
+                                                        yearly_maintenance_cost, tenor)
+        return schedule.to_frame(COST_METRICS_COLUMNS, rows=slice(-1, None)).round(2)
+
+    import pandas as pd  # Imported lazily to keep `import common_logic` cheap
+
+    table = amortization_table(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=tenor, method=method)
+    with profiler.span('DataFrame'):
+        df = pd.DataFrame(table, columns=TABLE_COLUMNS)
+    df['loan_amt'] = loan_amount
+    for name, column in cost_averages(df, tenor).items():
+        df[name] = column
+    df = df.round(2)
+
+    return df.tail(1)  # Take the last entry as we assume no redemption
+
+
+BREAK_EVEN_LOAN_AMOUNTS = np.arange(100000, 1210000, 10000)
+
+
+@instrument
+def produce_break_even_table(interest, tenor, hoa, maintenance, loan_amounts=BREAK_EVEN_LOAN_AMOUNTS):
+    import pandas as pd  # Imported lazily to keep `import common_logic` cheap
+
+    # Every loan amount is answered by scaling one cached $1 schedule for this rate and tenor
+    metrics = unit_schedules.cost_metrics(interest, loan_amounts, tenor, hoa, maintenance, tenor=tenor)
+    with profiler.span('DataFrame'):
+        df = pd.DataFrame({name: values.ravel() for name, values in metrics.items()})
+    df['loan_amt'] = df['loan_amt'].astype(np.asarray(loan_amounts).dtype)  # Integer amounts stay integers in the index
+    df2 = df[['loan_amt', 'year',
+              'avr_monthly_interest_and_fees',
+              'avr_monthly_interest_principal_fees',
+              'avr_monthly_principal',
+              'avr_monthly_interest',
+              'avr_monthly_fees',
+              'cumulative_interest_paid',
+              ]]
+
+    return df2
+
+
+def rent_totals(monthly_rent, inflation, redemption_month, comparative_mthly_installment=None):
+    """
+    Closed-form version of rent_calculator. Rent is flat within a year, so the total is a year-stepped geometric
+    series and costs the same for 12 months or 600. Every argument may be a scalar or a NumPy array.
     :param monthly_rent: initial monthly rent (in $)
     :param inflation: yearly inflation rate (in %)
     :param redemption_month: total number of months to calculate rent for
     :param comparative_mthly_installment: optional monthly installment for comparison (in $)
     :return: total_rent, average_monthly_rent, final_monthly_rent
     """
+    monthly_rent = np.asarray(monthly_rent, dtype=float)
+    growth = 1 + np.asarray(inflation, dtype=float) / 100
+    months = np.asarray(redemption_month)
+    full_years, remainder_months = np.divmod(months, 12)
+
+    # A cap of None or 0 means no cap, same as the loop's truthiness check
+    if comparative_mthly_installment is None:
+        cap = np.inf
+    else:
+        cap = np.asarray(comparative_mthly_installment, dtype=float)
+        cap = np.where(cap == 0, np.inf, cap)
+
+    # Rent in year y is min(base * growth^y, cap); it can only cross the cap if it grows
+    base = np.minimum(monthly_rent, cap)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        years_to_cap = np.ceil(np.log(cap / base) / np.log(growth))
+    can_cross = (growth > 1) & (base > 0) & np.isfinite(cap)
+    uncapped_years = np.where(can_cross, np.clip(np.nan_to_num(years_to_cap), 0, full_years), full_years)
+
+    total_rent = (12 * base * geometric_sum(growth - 1, uncapped_years)
+                  + 12 * np.where(np.isfinite(cap), cap, 0) * (full_years - uncapped_years)
+                  + remainder_months * np.minimum(base * growth ** full_years, cap))
+    # The rent is stepped up after every year, including a final partial one
+    last_year = np.where(remainder_months > 0, full_years, full_years - 1)
+    final_monthly_rent = np.where(months > 0, np.minimum(base * growth ** last_year, cap) * growth, monthly_rent)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average_monthly_rent = total_rent / months
+
+    return as_scalar(total_rent), as_scalar(average_monthly_rent), as_scalar(final_monthly_rent)
+
+
+def _rent_totals_scalar(monthly_rent, inflation, redemption_month, comparative_mthly_installment=None):
+    # rent_totals for plain numbers, with math instead of NumPy
+    growth = 1 + inflation / 100
+    full_years, remainder_months = divmod(redemption_month, 12)
+    cap = comparative_mthly_installment or math.inf
+
+    base = min(monthly_rent, cap)
+    uncapped_years = full_years
+    if growth > 1 and base > 0 and cap < math.inf:
+        uncapped_years = min(max(math.ceil(math.log(cap / base) / math.log(growth)), 0), full_years)
+
+    total_rent = (12 * base * _geometric_sum_scalar(growth - 1, uncapped_years)
+                  + 12 * (cap if cap < math.inf else 0) * (full_years - uncapped_years)
+                  + remainder_months * min(base * growth ** full_years, cap))
+    last_year = full_years if remainder_months > 0 else full_years - 1
+    final_monthly_rent = min(base * growth ** last_year, cap) * growth if redemption_month > 0 else monthly_rent
+    average_monthly_rent = total_rent / redemption_month if redemption_month else math.nan
+
+    return total_rent, average_monthly_rent, final_monthly_rent
+
+
+def _rent_loop(monthly_rent, inflation, redemption_month, comparative_mthly_installment=None):
+    # Reference month-by-month implementation, kept for verification
     total_rent = 0
     months = 0
     inflation_rate = inflation / 100
@@ -107,6 +408,27 @@ def rent_calculator(monthly_rent, inflation, redemption_month, comparative_mthly
 
     return total_rent, average_monthly_rent, final_monthly_rent
 
+
+@instrument
+def rent_calculator(monthly_rent, inflation, redemption_month, comparative_mthly_installment=None, method='closed_form'):
+    """
+    Calculates the total and average monthly rent over a specified period, taking into account yearly inflation and a potential comparative monthly installment
+    :param monthly_rent: initial monthly rent (in $)
+    :param inflation: yearly inflation rate (in %)
+    :param redemption_month: total number of months to calculate rent for
+    :param comparative_mthly_installment: optional monthly installment for comparison (in $)
+    :param method: 'closed_form' (default) or 'loop' to run the month-by-month reference implementation
+    :return: total_rent, average_monthly_rent, final_monthly_rent
+    """
+    if method == 'loop':
+        return _rent_loop(monthly_rent, inflation, redemption_month, comparative_mthly_installment)
+    if method != 'closed_form':
+        raise ValueError(f"Unknown method {method!r}, expected 'closed_form' or 'loop'")
+
+    totals = (_rent_totals_scalar if all_numbers(monthly_rent, inflation, redemption_month)
+              and (comparative_mthly_installment is None or all_numbers(comparative_mthly_installment)) else rent_totals)
+    return tuple(float(value) for value in totals(monthly_rent, inflation, redemption_month, comparative_mthly_installment))
+
 # # Rental Projections:
 # monthly_rent = 3100  # $1000 initial monthly rent
 # inflation = 3.5  # 2% yearly inflation
@@ -119,29 +441,70 @@ def rent_calculator(monthly_rent, inflation, redemption_month, comparative_mthly
 # print(f"Final Monthly Rent: ${final_monthly_rent:.2f}")
 
 
-
-# # Property Sales Params
-# raw_profit = 200000
-# raw_profit_less_interest_paid = raw_profit - cumulative_interest_paid
-# actual_profit = raw_profit_less_interest_paid - hoa_paid - maintenance_paid
-# actual_profit
-#
-# print(f'Flipping a house after {redemption_month/12} yrs would change your savings by ${actual_profit:.0f} versus -${total_rent_paid:.0f} if you rented.')
-#
-#
-# # Opportunity Cost
-# downpayment_mortgage = 200000
-
-def investment_calculator(initial_deposit, monthly_contribution, annual_returns, investment_months, annual_contribution_incr_pct=0):
+def investment_totals(initial_deposit, monthly_contribution, annual_returns, investment_months, annual_contribution_incr_pct=0):
     """
-    Calculates the compounded investment returns over a specified period, including an initial deposit and monthly contributions
+    Closed-form version of investment_calculator. Contributions step once a year, so the balance is a
+    year-stepped geometric series and costs the same for any horizon. Every argument may be a scalar or a NumPy array.
     :param initial_deposit: initial investment amount (in $)
     :param monthly_contribution: monthly investment contribution (in $)
     :param annual_returns: annual return rate (in %)
     :param investment_months: total number of months to calculate returns for
-    :param annual_contribution_incr_pct: annual increase in monthly contribution (in %)
+    :param annual_contribution_incr_pct: annual increase in monthly contribution (in %), may be negative
     :return: total_savings_invested, total_investment_gains, final_balance
     """
+    initial_deposit = np.asarray(initial_deposit, dtype=float)
+    monthly_contribution = np.asarray(monthly_contribution, dtype=float)
+    monthly_returns = np.asarray(annual_returns, dtype=float) / 12 / 100
+    contribution_growth = 1 + np.asarray(annual_contribution_incr_pct, dtype=float) / 100
+    full_years, remainder_months = np.divmod(np.asarray(investment_months), 12)
+
+    # One full year turns a balance B into B * yearly_growth + contribution * year_annuity
+    yearly_growth = (1 + monthly_returns) ** 12
+    year_annuity = geometric_sum(monthly_returns, 12)
+    # sum over years y < F of contribution_growth^y * yearly_growth^(F-1-y)
+    contributions_factor = (yearly_growth ** (full_years - 1)
+                            * geometric_sum((contribution_growth - yearly_growth) / yearly_growth, full_years))
+    principle = initial_deposit * yearly_growth ** full_years + monthly_contribution * year_annuity * contributions_factor
+
+    # Then the remaining months of the final partial year
+    last_contribution = monthly_contribution * contribution_growth ** full_years
+    principle = (principle * (1 + monthly_returns) ** remainder_months
+                 + last_contribution * geometric_sum(monthly_returns, remainder_months))
+    total_savings_invested = (initial_deposit
+                              + 12 * monthly_contribution * geometric_sum(contribution_growth - 1, full_years)
+                              + remainder_months * last_contribution)
+
+    total_investment_gains = principle - total_savings_invested
+    final_balance = principle
+
+    return as_scalar(total_savings_invested), as_scalar(total_investment_gains), as_scalar(final_balance)
+
+
+def _investment_totals_scalar(initial_deposit, monthly_contribution, annual_returns, investment_months,
+                              annual_contribution_incr_pct=0):
+    # investment_totals for plain numbers, with math instead of NumPy
+    monthly_returns = annual_returns / 12 / 100
+    contribution_growth = 1 + annual_contribution_incr_pct / 100
+    full_years, remainder_months = divmod(investment_months, 12)
+
+    yearly_growth = (1 + monthly_returns) ** 12
+    contributions_factor = (yearly_growth ** (full_years - 1)
+                            * _geometric_sum_scalar((contribution_growth - yearly_growth) / yearly_growth, full_years))
+    principle = (initial_deposit * yearly_growth ** full_years
+                 + monthly_contribution * _geometric_sum_scalar(monthly_returns, 12) * contributions_factor)
+
+    last_contribution = monthly_contribution * contribution_growth ** full_years
+    principle = (principle * (1 + monthly_returns) ** remainder_months
+                 + last_contribution * _geometric_sum_scalar(monthly_returns, remainder_months))
+    total_savings_invested = (initial_deposit
+                              + 12 * monthly_contribution * _geometric_sum_scalar(contribution_growth - 1, full_years)
+                              + remainder_months * last_contribution)
+
+    return total_savings_invested, principle - total_savings_invested, principle
+
+
+def _investment_loop(initial_deposit, monthly_contribution, annual_returns, investment_months, annual_contribution_incr_pct=0):
+    # Reference month-by-month implementation, kept for verification
     monthly_returns = annual_returns / 12 / 100
     total_savings_invested = initial_deposit
     principle = initial_deposit
@@ -161,6 +524,44 @@ def investment_calculator(initial_deposit, monthly_contribution, annual_returns,
 
     return total_savings_invested, total_investment_gains, final_balance
 
+
+@instrument
+def investment_calculator(initial_deposit, monthly_contribution, annual_returns, investment_months, annual_contribution_incr_pct=0,
+                          method='closed_form'):
+    """
+    Calculates the compounded investment returns over a specified period, including an initial deposit and monthly contributions
+    :param initial_deposit: initial investment amount (in $)
+    :param monthly_contribution: monthly investment contribution (in $)
+    :param annual_returns: annual return rate (in %)
+    :param investment_months: total number of months to calculate returns for
+    :param annual_contribution_incr_pct: annual increase in monthly contribution (in %)
+    :param method: 'closed_form' (default) or 'loop' to run the month-by-month reference implementation
+    :return: total_savings_invested, total_investment_gains, final_balance
+    """
+    if method == 'loop':
+        return _investment_loop(initial_deposit, monthly_contribution, annual_returns, investment_months,
+                                annual_contribution_incr_pct)
+    if method != 'closed_form':
+        raise ValueError(f"Unknown method {method!r}, expected 'closed_form' or 'loop'")
+
+    totals = (_investment_totals_scalar if all_numbers(initial_deposit, monthly_contribution, annual_returns,
+                                                        investment_months, annual_contribution_incr_pct)
+              else investment_totals)
+    return tuple(float(value) for value in totals(initial_deposit, monthly_contribution, annual_returns,
+                                                  investment_months, annual_contribution_incr_pct))
+
+# # Property Sales Params
+# raw_profit = 200000
+# raw_profit_less_interest_paid = raw_profit - cumulative_interest_paid
+# actual_profit = raw_profit_less_interest_paid - hoa_paid - maintenance_paid
+# actual_profit
+#
+# print(f'Flipping a house after {redemption_month/12} yrs would change your savings by ${actual_profit:.0f} versus -${total_rent_paid:.0f} if you rented.')
+#
+#
+# # Opportunity Cost
+# downpayment_mortgage = 200000
+#
 # # Example usage:
 # initial_deposit = downpayment_mortgage  # $200,000 initial deposit
 # monthly_contribution = 3400  # Rent, or $3400 monthly contribution
@@ -175,52 +576,280 @@ def investment_calculator(initial_deposit, monthly_contribution, annual_returns,
 # print(f"Final Balance: ${int(final_balance)}")
 
 
+@instrument
+def buy_vs_rent(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, sticker_profit_from_home_sales,
+                monthly_rent, inflation, initial_deposit, annual_returns, tenor=360):
+    """
+    Runs the whole buy vs rent comparison the way streamlit_app does: the buyer sells after the redemption month,
+    the renter pays rent capped at the monthly installment and invests the downpayment plus the rest of the
+    installment. Every argument may be a scalar or a NumPy array, so a batch of scenarios is one call.
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param sticker_profit_from_home_sales: profit from flipping the property (in $)
+    :param monthly_rent: initial monthly rent (in $)
+    :param inflation: yearly rent inflation rate (in %)
+    :param initial_deposit: mortgage downpayment, invested instead when renting (in $)
+    :param annual_returns: annual investment return rate (in %)
+    :param tenor: (in months)
+    :return: dict of every stat shown in the app, plus buy_net_position, rent_net_position and net_position (buy - rent)
+    """
+    cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid = amortization_totals(
+        interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor)
+    actual_profit = (loan_amount + initial_deposit + sticker_profit_from_home_sales) - initial_deposit - cumulative_interest_paid - hoa_paid - maintenance_paid - outstanding_principal
+
+    total_rent_paid, average_monthly_rent, final_monthly_rent = rent_totals(
+        monthly_rent, inflation, redemption_month, comparative_mthly_installment=monthly_payment)
+
+    # Whatever is left of the installment after rent is invested; it shrinks as the rent goes up
+    monthly_contribution = monthly_payment - monthly_rent
+    total_savings_invested, total_investment_gains, final_balance = investment_totals(
+        initial_deposit, monthly_contribution, annual_returns, redemption_month, -np.asarray(inflation, dtype=float))
+
+    return {
+        'cumulative_interest_paid': cumulative_interest_paid,
+        'cumulative_principal_paid': cumulative_principal_paid,
+        'outstanding_principal': outstanding_principal,
+        'monthly_payment': monthly_payment,
+        'hoa_paid': hoa_paid,
+        'maintenance_paid': maintenance_paid,
+        'total_rent_paid': total_rent_paid,
+        'average_monthly_rent': average_monthly_rent,
+        'final_monthly_rent': final_monthly_rent,
+        'total_savings_invested': total_savings_invested,
+        'total_investment_gains': total_investment_gains,
+        'final_balance': final_balance,
+        'buy_net_position': as_scalar(actual_profit),
+        'rent_net_position': as_scalar(final_balance - total_rent_paid),
+        'net_position': as_scalar(actual_profit - (final_balance - total_rent_paid)),
+    }
+
+
+# Columns of the monthly_projection time series, all stored in one float buffer
+PROJECTION_COLUMNS = (
+    'month', 'interest_paid', 'principal_paid', 'outstanding_principal', 'cumulative_interest_paid',
+    'cumulative_principal_paid', 'hoa_paid', 'maintenance_paid', 'monthly_rent', 'total_rent_paid',
+    'monthly_contribution', 'total_savings_invested', 'investment_balance', 'buy_net_position', 'rent_net_position',
+)
+# The loan half and the rent/portfolio half; the rent side depends on the loan only through the installment
+LOAN_PROJECTION_COLUMNS = PROJECTION_COLUMNS[1:8]
+RENT_PROJECTION_COLUMNS = PROJECTION_COLUMNS[8:13]
+
+
+@instrument
+def loan_projection(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+    """
+    Loan side of monthly_projection
+    :return: (columns, monthly_payment): columns maps each LOAN_PROJECTION_COLUMNS name to a NumPy column
+    """
+    months = np.arange(1, int(redemption_month) + 1)
+    series = dict(zip(LOAN_PROJECTION_COLUMNS, np.empty((len(LOAN_PROJECTION_COLUMNS), len(months)))))
 
+    # Payments stop once the tenor is reached
+    monthly_interest = interest_rate / 12 / 100
+    monthly_payment = pmt(monthly_interest, tenor, -loan_amount)
+    paying_months, outstanding_principal = loan_balance(monthly_interest, loan_amount, monthly_payment, months, tenor)
+    series['outstanding_principal'][:] = outstanding_principal
+    series['cumulative_principal_paid'][:] = loan_amount - series['outstanding_principal']
+    series['cumulative_interest_paid'][:] = paying_months * monthly_payment - series['cumulative_principal_paid']
+    series['interest_paid'][:] = np.diff(series['cumulative_interest_paid'], prepend=0.0)
+    series['principal_paid'][:] = np.diff(series['cumulative_principal_paid'], prepend=0.0)
+    series['hoa_paid'][:] = paying_months * hoa
+    series['maintenance_paid'][:] = paying_months * yearly_maintenance_cost / 12
+    return series, float(monthly_payment)
+
+
+@instrument
+def rent_projection(monthly_payment, monthly_rent, inflation, initial_deposit, annual_returns, redemption_month):
+    """
+    Rent and portfolio side of monthly_projection, for a given installment
+    :return: dict mapping each RENT_PROJECTION_COLUMNS name to a NumPy column
+    """
+    months = np.arange(1, int(redemption_month) + 1)
+    series = dict(zip(RENT_PROJECTION_COLUMNS, np.empty((len(RENT_PROJECTION_COLUMNS), len(months)))))
 
+    # Rent: flat within a year, stepped up yearly and capped at the installment
+    years = (months - 1) // 12
+    rent_growth = 1 + inflation / 100
+    cap = monthly_payment if monthly_payment else np.inf
+    series['monthly_rent'][:] = np.minimum(min(monthly_rent, cap) * rent_growth ** years, cap)
+    np.cumsum(series['monthly_rent'], out=series['total_rent_paid'])
 
+    # Portfolio: balance_m = growth^m * (deposit + sum of contribution_j / growth^j), which avoids a loop
+    monthly_returns = annual_returns / 12 / 100
+    series['monthly_contribution'][:] = (monthly_payment - monthly_rent) * (1 - inflation / 100) ** years
+    series['total_savings_invested'][:] = initial_deposit + np.cumsum(series['monthly_contribution'])
+    discount = (1 + monthly_returns) ** -months.astype(float)
+    series['investment_balance'][:] = (initial_deposit + np.cumsum(series['monthly_contribution'] * discount)) / discount
+    return series
 
 
+def combine_projections(loan, monthly_payment, rent, sticker_profit_from_home_sales, inflation):
+    """
+    Assembles the two halves into the monthly_projection result
+    :param loan: columns returned by loan_projection
+    :param monthly_payment: installment returned by loan_projection
+    :param rent: columns returned by rent_projection for that installment
+    :param sticker_profit_from_home_sales: profit from flipping the property (in $)
+    :param inflation: yearly rent inflation rate (in %)
+    :return: same as monthly_projection
+    """
+    redemption_month = len(loan['interest_paid'])
+    buffer = np.empty((len(PROJECTION_COLUMNS), redemption_month))
+    series = dict(zip(PROJECTION_COLUMNS, buffer))
+    months = np.arange(1, redemption_month + 1)
+    series['month'][:] = months
+    for name in LOAN_PROJECTION_COLUMNS:
+        series[name][:] = loan[name]
+    for name in RENT_PROJECTION_COLUMNS:
+        series[name][:] = rent[name]
+    series['buy_net_position'][:] = (sticker_profit_from_home_sales + series['cumulative_principal_paid']
+                                     - series['cumulative_interest_paid'] - series['hoa_paid'] - series['maintenance_paid'])
+    series['rent_net_position'][:] = series['investment_balance'] - series['total_rent_paid']
+
+    net_position = series['buy_net_position'] - series['rent_net_position']
+    flipped = np.flatnonzero((net_position >= 0) != (net_position[0] >= 0)) if redemption_month else []
+    crossover_month = int(months[flipped[0]]) if len(flipped) else None
+
+    last = redemption_month - 1
+    summary = {
+        'cumulative_interest_paid': float(series['cumulative_interest_paid'][last]),
+        'cumulative_principal_paid': float(series['cumulative_principal_paid'][last]),
+        'outstanding_principal': float(series['outstanding_principal'][last]),
+        'monthly_payment': float(monthly_payment),
+        'hoa_paid': float(series['hoa_paid'][last]),
+        'maintenance_paid': float(series['maintenance_paid'][last]),
+        'total_rent_paid': float(series['total_rent_paid'][last]),
+        'average_monthly_rent': float(series['total_rent_paid'][last] / redemption_month),
+        # The rent is stepped up once more at the end of the final (possibly partial) year
+        'final_monthly_rent': float(series['monthly_rent'][last] * (1 + inflation / 100)),
+        'total_savings_invested': float(series['total_savings_invested'][last]),
+        'total_investment_gains': float(series['investment_balance'][last] - series['total_savings_invested'][last]),
+        'final_balance': float(series['investment_balance'][last]),
+        'buy_net_position': float(series['buy_net_position'][last]),
+        'rent_net_position': float(series['rent_net_position'][last]),
+        'net_position': float(net_position[last]),
+    }
+    return series, summary, crossover_month
+
+
+@instrument
+def monthly_projection(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                       sticker_profit_from_home_sales, monthly_rent, inflation, initial_deposit, annual_returns, tenor=360):
+    """
+    Month-by-month projection of the loan, the rent and the renter's portfolio, gathered into a single columnar
+    buffer, so the net positions can be charted month by month. The loan and the rent sides are computed by
+    loan_projection and rent_projection, which can be cached separately.
+    Takes the same arguments as buy_vs_rent.
+    :return: (series, summary, crossover_month): series maps each PROJECTION_COLUMNS name to a NumPy column
+             (views into one buffer), summary holds the buy_vs_rent stats at the redemption month, and
+             crossover_month is the first month whose net position has the opposite sign to month 1 (or None)
+    """
+    loan, monthly_payment = loan_projection(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                                            tenor)
+    rent = rent_projection(monthly_payment, monthly_rent, inflation, initial_deposit, annual_returns, redemption_month)
+    return combine_projections(loan, monthly_payment, rent, sticker_profit_from_home_sales, inflation)
+
+
+# Scenario columns accepted by the batch CLI, with the app's defaults for anything left out
+DEFAULT_SCENARIO = {
+    'interest_rate': 7.0,
+    'loan_amount': 1100000.0,
+    'year_tenor': 30,
+    'redemption_year': 5,
+    'sticker_profit_from_home_sales': 140000.0,
+    'hoa': 200.0,
+    'yearly_maintenance_cost': 1200.0,
+    'monthly_rent': 3100.0,
+    'inflation': 5.0,
+    'initial_deposit': 200000.0,
+    'annual_returns': 5.0,
+}
+
+
+def _read_scenarios(path):
+    # Yields scenario dicts from a .csv, .jsonl or .json file
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f)
+    elif path.endswith('.jsonl'):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith('.json'):
+        with open(path) as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f"Unsupported scenario file {path!r}, expected .csv, .jsonl or .json")
 
 
-# raw_profit_less_interest_paid = raw_profit - cumulative_interest_paid
-# actual_profit = raw_profit_less_interest_paid - hoa_paid - maintenance_paid
-# actual_profit
-
-
-# Full Run
-
-# Property Loan Params:
-interest = 7  # 8% annual interest
-loan_amount = 1100000  # $1,400,000 loan
-hoa = 200  # $200 monthly HOA fee
-yearly_maintenance_cost = 1200  # $1200 yearly maintenance cost
-tenor = 360  # Defaults to 30 years (360 months) loan unless specified
-redemption_month = 60  # Loan redeemed in 60 months (5 years)
-sticker_profit_from_home_sales = 140000
-cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid = amortization_calculator(interest, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor)
-actual_profit = sticker_profit_from_home_sales - cumulative_interest_paid - hoa_paid - maintenance_paid
-
-# Rental Params:
-monthly_rent = 3100  # $1000 initial monthly rent
-inflation = 5  # 2% yearly inflation
-redemption_month = redemption_month  # Calculate rent for 60 months (5 years)
-total_rent_paid, average_monthly_rent, final_monthly_rent = rent_calculator(monthly_rent, inflation, redemption_month)
-
-# Opportunity Cost Params:
-downpayment_mortgage = 40344.74
-initial_deposit = downpayment_mortgage  # $200,000 initial deposit or downpayment mortgage
-monthly_contribution = monthly_payment - monthly_rent  # Rent, or $3400 monthly contribution
-annual_returns = 5  # 7% annual return rate
-investment_months = redemption_month  # Calculate returns for 60 months (5 years)
-annual_contribution_incr_pct = -inflation  # annual contribution decreases since more $ going into rent rather than investment
-total_savings_invested, total_investment_gains, final_balance = investment_calculator(initial_deposit, monthly_contribution, annual_returns, investment_months, annual_contribution_incr_pct)
-
-print(f'Flipping a house after {int(redemption_month/12)} yrs at a ${int(sticker_profit_from_home_sales/1000)}k profit would change your savings by ${int(actual_profit)}')
-print(f'Renting for {int(redemption_month/12)} yrs would change your savings by -${int(total_rent_paid)}')
-print(f'Investing the money that would otherwise go into said mortgage will make you ${int(final_balance)}')
-print(f'So by renting, your balance would be ${int(final_balance-total_rent_paid)} vs buying balance ${int(actual_profit)}')
-
-
-
-
-
+def evaluate_scenarios(scenarios):
+    """
+    Evaluates a list of scenario dicts (keys from DEFAULT_SCENARIO) as one vectorized batch.
+    :param scenarios: list of dicts; missing keys fall back to DEFAULT_SCENARIO
+    :return: list of dicts holding the inputs followed by the buy_vs_rent results
+    """
+    unknown = {key for scenario in scenarios for key in scenario} - set(DEFAULT_SCENARIO)
+    if unknown:
+        raise ValueError(f"Unknown scenario columns: {', '.join(sorted(unknown))}")
+
+    columns = {key: np.array([default if scenario.get(key) in (None, '') else float(scenario[key]) for scenario in scenarios],
+                             dtype=float)
+               for key, default in DEFAULT_SCENARIO.items()}
+    results = buy_vs_rent(
+        columns['interest_rate'], columns['loan_amount'], (columns['redemption_year'] * 12).astype(int),
+        columns['hoa'], columns['yearly_maintenance_cost'], columns['sticker_profit_from_home_sales'],
+        columns['monthly_rent'], columns['inflation'], columns['initial_deposit'], columns['annual_returns'],
+        tenor=(columns['year_tenor'] * 12).astype(int))
+
+    rows = [dict(zip(columns, values)) for values in zip(*(column.tolist() for column in columns.values()))]
+    for row, values in zip(rows, zip(*(np.broadcast_to(value, len(rows)).tolist() for value in results.values()))):
+        row.update(zip(results, values))
+    return rows
+
+
+def main(argv=None):
+    """Batch CLI: python common_logic.py scenarios.csv -o results.csv"""
+    startup_cpu_time = time.process_time()  # Interpreter start-up plus imports
+    parser = argparse.ArgumentParser(description="Evaluate buy vs rent scenarios in batch.")
+    parser.add_argument('scenarios', help="scenario file (.csv, .jsonl or .json) with columns: " + ', '.join(DEFAULT_SCENARIO))
+    parser.add_argument('-o', '--output', help="results file (.csv or .jsonl); defaults to CSV on stdout")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="scenarios evaluated per vectorized batch")
+    parser.add_argument('--timing', action='store_true', help="report start-up and evaluation time on stderr")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    as_jsonl = bool(args.output) and args.output.endswith('.jsonl')
+    writer = None
+    evaluated = 0
+    try:
+        scenarios = _read_scenarios(args.scenarios)
+        while True:
+            chunk = list(itertools.islice(scenarios, args.chunk_size))
+            if not chunk:
+                break
+            for row in evaluate_scenarios(chunk):
+                if as_jsonl:
+                    output.write(json.dumps(row) + '\n')
+                    continue
+                if writer is None:
+                    writer = csv.DictWriter(output, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+            evaluated += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+    if args.timing:
+        elapsed = time.perf_counter() - started
+        print(f"start-up: {startup_cpu_time * 1000:.1f} ms CPU, evaluated {evaluated} scenarios in {elapsed * 1000:.1f} ms",
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
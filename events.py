@@ -0,0 +1,164 @@
+"""
+Prepayment and refinance events on top of a fixed-rate loan.
+
+Events split the loan into segments with a constant rate and a constant monthly outflow (installment plus
+any recurring extra principal). Each segment is jumped over in closed form, including an early payoff
+inside it, so the cost depends on the number of events, not the number of months.
+
+Month numbers follow amortization_calculator: month 1 is the first payment. A lump sum or a refinance at
+month m happens right after that month's payment; a recurring extra is paid with every payment from
+start_month to end_month.
+"""
+import math
+from collections import namedtuple
+
+from common_logic import pmt
+
+LumpSum = namedtuple('LumpSum', ['month', 'amount'])
+ExtraPrincipal = namedtuple('ExtraPrincipal', ['start_month', 'amount', 'end_month'], defaults=[None])
+Refinance = namedtuple('Refinance', ['month', 'interest_rate', 'tenor', 'closing_costs', 'roll_costs'], defaults=[0.0, False])
+
+
+def _jump(balance, monthly_interest, outflow, months):
+    # Advances `months` payments of `outflow`; returns (balance, total_paid, months_paid), stopping at payoff
+    if months <= 0 or balance <= 0:
+        return balance, 0.0, 0
+    growth = 1 + monthly_interest
+    if outflow <= balance * monthly_interest:
+        payoff = math.inf  # The payment does not even cover the interest
+    elif monthly_interest == 0:
+        payoff = math.ceil(balance / outflow)
+    else:
+        payoff = math.ceil(math.log(outflow / (outflow - monthly_interest * balance)) / math.log(growth))
+
+    full_months = min(months, payoff - 1)
+    annuity = full_months if monthly_interest == 0 else (growth ** full_months - 1) / monthly_interest
+    new_balance = balance * growth ** full_months - outflow * annuity
+    paid = outflow * full_months
+    if full_months < months:
+        # The final payment only clears what is left
+        paid += new_balance * growth
+        return 0.0, paid, full_months + 1
+    return new_balance, paid, full_months
+
+
+def event_totals(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360, events=()):
+    """
+    Cumulative totals of a loan with prepayment and refinance events.
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param tenor: (in months)
+    :param events: iterable of LumpSum, ExtraPrincipal and Refinance
+    :return: dict with cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment
+             (installment in force at redemption), total_paid, closing_costs_paid (in cash), payoff_month (or None),
+             hoa_paid and maintenance_paid
+    """
+    events = list(events)
+    extras = [event for event in events if isinstance(event, ExtraPrincipal)]
+    at_month = [event for event in events if isinstance(event, (LumpSum, Refinance))]
+
+    # Segment boundaries: every month where the rate or the monthly outflow can change
+    boundaries = {0, redemption_month, tenor}
+    boundaries.update(event.month for event in at_month)
+    for extra in extras:
+        boundaries.add(extra.start_month - 1)
+        if extra.end_month is not None:
+            boundaries.add(extra.end_month)
+    boundaries = sorted(boundary for boundary in boundaries if 0 <= boundary <= redemption_month)
+
+    monthly_interest = interest_rate / 12 / 100
+    monthly_payment = pmt(monthly_interest, tenor, -loan_amount)
+    loan_end = tenor
+    balance = float(loan_amount)
+    borrowed = float(loan_amount)
+    total_paid = 0.0
+    closing_costs_paid = 0.0
+    payoff_month = None
+
+    for start, end in zip(boundaries, boundaries[1:]):
+        outflow = monthly_payment + sum(extra.amount for extra in extras
+                                        if extra.start_month <= start + 1 and (extra.end_month is None or extra.end_month >= end))
+        months = min(end, loan_end) - start
+        balance, paid, months_paid = _jump(balance, monthly_interest, outflow, months)
+        total_paid += paid
+        if balance <= 0 and payoff_month is None and months_paid:
+            payoff_month = start + months_paid
+        if start + months_paid >= loan_end and balance > 0:
+            # Float noise at the end of the term
+            total_paid += balance
+            balance = 0.0
+            payoff_month = payoff_month or loan_end
+
+        for event in sorted((event for event in at_month if event.month == end), key=lambda event: isinstance(event, Refinance)):
+            if isinstance(event, LumpSum) and balance > 0:
+                amount = min(event.amount, balance)
+                balance -= amount
+                total_paid += amount
+                if balance <= 0:
+                    payoff_month = payoff_month or end
+            elif isinstance(event, Refinance) and balance > 0:
+                if event.roll_costs:
+                    balance += event.closing_costs
+                    borrowed += event.closing_costs
+                else:
+                    closing_costs_paid += event.closing_costs
+                monthly_interest = event.interest_rate / 12 / 100
+                monthly_payment = pmt(monthly_interest, event.tenor, -balance)
+                loan_end = end + event.tenor
+
+    outstanding_principal = max(balance, 0.0)
+    cumulative_principal_paid = borrowed - outstanding_principal
+    owned_months = min(redemption_month, tenor)  # Same convention as amortization_totals
+    return {
+        'cumulative_interest_paid': total_paid - cumulative_principal_paid,
+        'cumulative_principal_paid': cumulative_principal_paid,
+        'outstanding_principal': outstanding_principal,
+        'monthly_payment': monthly_payment,
+        'total_paid': total_paid,
+        'closing_costs_paid': closing_costs_paid,
+        'payoff_month': payoff_month,
+        'hoa_paid': owned_months * hoa,
+        'maintenance_paid': owned_months * yearly_maintenance_cost / 12,
+    }
+
+
+def buy_net_position(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                     sticker_profit_from_home_sales, tenor=360, events=()):
+    """
+    Buy-side net position with events, defined like actual_profit in streamlit_app. Rolled-in closing costs
+    reduce the equity; closing costs paid in cash are a cost of their own.
+    :return: (net position, event_totals dict)
+    """
+    totals = event_totals(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor, events)
+    net_position = (sticker_profit_from_home_sales + loan_amount - totals['outstanding_principal']
+                    - totals['cumulative_interest_paid'] - totals['hoa_paid'] - totals['maintenance_paid']
+                    - totals['closing_costs_paid'])
+    return net_position, totals
+
+
+def best_refinance_month(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                         sticker_profit_from_home_sales, refinance_rate, refinance_tenor, closing_costs=0.0,
+                         roll_costs=False, tenor=360, events=()):
+    """
+    Tries a refinance after every month before the sale and keeps the one that leaves the buyer best off.
+    :param refinance_rate: rate of the new loan (in %)
+    :param refinance_tenor: tenor of the new loan (in months)
+    :param closing_costs: closing costs of the refinance (in $)
+    :param roll_costs: add the closing costs to the new loan instead of paying them in cash
+    :param events: other events that always apply
+    :return: (best month or None if refinancing never helps, net position at that month, net position without refinancing)
+    """
+    events = list(events)
+    without, _ = buy_net_position(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                                  sticker_profit_from_home_sales, tenor, events)
+    best_month, best = None, without
+    for month in range(1, redemption_month):
+        refinance = Refinance(month, refinance_rate, refinance_tenor, closing_costs, roll_costs)
+        net_position, _ = buy_net_position(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                                           sticker_profit_from_home_sales, tenor, events + [refinance])
+        if net_position > best:
+            best_month, best = month, net_position
+    return best_month, best, without
@@ -0,0 +1,164 @@
+"""
+Chunked export of large break-even sweeps.
+
+A Sweep is the cross product of loan amounts x interest rates x tenors x HOA fees x maintenance costs, with the
+loan held for its full tenor, as in produce_break_even_table. Rows are never materialized all at once. Any
+range of rows is computed on demand with one cost_metrics_grid call, so a page for the app and a chunk for a
+file writer cost the same. Files are written one chunk at a time: CSV with the standard library, Parquet with
+pyarrow when it is installed.
+
+    python export.py sweep.csv --loans 100000 1200000 1000 --rates 2 10 0.125 --tenors 120 180 240 360
+"""
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+
+from common_logic import BREAK_EVEN_LOAN_AMOUNTS, cost_metrics_grid
+
+# The sweep axes, slowest varying first; the loan amount varies fastest so each page reads like a break-even table
+AXES = ('interest_rate', 'tenor', 'hoa', 'yearly_maintenance_cost', 'loan_amt')
+# Same metrics as produce_break_even_table
+METRICS = ('year', 'avr_monthly_interest_and_fees', 'avr_monthly_interest_principal_fees', 'avr_monthly_principal',
+           'avr_monthly_interest', 'avr_monthly_fees', 'cumulative_interest_paid')
+COLUMNS = AXES + METRICS
+
+
+class Sweep:
+    """
+    Lazily evaluated grid of break-even metrics.
+    :param loan_amounts: loan amounts (in $)
+    :param interest_rates: interest rates (in %)
+    :param tenors: tenors (in months)
+    :param hoas: monthly HOA fees (in $)
+    :param yearly_maintenance_costs: yearly maintenance costs (in $)
+    """
+
+    def __init__(self, loan_amounts=BREAK_EVEN_LOAN_AMOUNTS, interest_rates=(7.0,), tenors=(360,), hoas=(200.0,),
+                 yearly_maintenance_costs=(15000.0,)):
+        self.axes = {
+            'interest_rate': np.atleast_1d(np.asarray(interest_rates, dtype=float)),
+            'tenor': np.atleast_1d(np.asarray(tenors, dtype=int)),
+            'hoa': np.atleast_1d(np.asarray(hoas, dtype=float)),
+            'yearly_maintenance_cost': np.atleast_1d(np.asarray(yearly_maintenance_costs, dtype=float)),
+            'loan_amt': np.atleast_1d(np.asarray(loan_amounts, dtype=float)),
+        }
+        self.shape = tuple(len(values) for values in self.axes.values())
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def rows(self, start, stop):
+        """
+        Computes rows [start, stop) of the sweep
+        :return: dict of arrays keyed by COLUMNS
+        """
+        flat = np.arange(max(start, 0), min(stop, len(self)))
+        indices = np.unravel_index(flat, self.shape)
+        columns = {name: values[index] for (name, values), index in zip(self.axes.items(), indices)}
+        metrics = cost_metrics_grid(columns['interest_rate'], columns['loan_amt'], columns['tenor'], columns['hoa'],
+                                    columns['yearly_maintenance_cost'], tenor=columns['tenor'])
+        columns.update((name, metrics[name]) for name in METRICS)
+        return columns
+
+    def chunks(self, chunk_size=100000):
+        """:return: iterator of row dicts of at most chunk_size rows each"""
+        for start in range(0, len(self), chunk_size):
+            yield self.rows(start, start + chunk_size)
+
+    def page(self, number, page_size=100):
+        """:return: pandas DataFrame of page `number` (from 0), indexed by row number"""
+        import pandas as pd  # Imported lazily, like in common_logic
+
+        start = number * page_size
+        return pd.DataFrame(self.rows(start, start + page_size),
+                            index=pd.RangeIndex(start, min(start + page_size, len(self)), name="row"))
+
+
+def write_csv(sweep, file, chunk_size=100000):
+    """
+    Writes the sweep as CSV one chunk at a time
+    :param file: path or open text file
+    :return: rows written
+    """
+    own_file = isinstance(file, str)
+    f = open(file, 'w', newline='') if own_file else file
+    try:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for chunk in sweep.chunks(chunk_size):
+            writer.writerows(zip(*(chunk[name].tolist() for name in COLUMNS)))
+    finally:
+        if own_file:
+            f.close()
+    return len(sweep)
+
+
+def write_parquet(sweep, file, chunk_size=100000):
+    """
+    Writes the sweep as Parquet, one row group per chunk. Needs pyarrow.
+    :param file: path or open binary file
+    :return: rows written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Writing Parquet needs pyarrow (pip install pyarrow)") from None
+
+    writer = None
+    try:
+        for chunk in sweep.chunks(chunk_size):
+            table = pa.table({name: chunk[name] for name in COLUMNS})
+            if writer is None:
+                writer = pq.ParquetWriter(file, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return len(sweep)
+
+
+def export(sweep, path, chunk_size=100000):
+    """Writes the sweep to a .csv or .parquet file, chosen by the extension; :return: rows written"""
+    if path.endswith('.csv'):
+        return write_csv(sweep, path, chunk_size)
+    if path.endswith('.parquet'):
+        return write_parquet(sweep, path, chunk_size)
+    raise ValueError(f"Unsupported export file {path!r}, expected .csv or .parquet")
+
+
+def steps(start, stop, step):
+    """
+    Evenly spaced sweep axis, like np.arange, but stop is included when it is a whole number of steps away (up to
+    float error) and never exceeded, which np.arange(start, stop + step / 2, step) does not guarantee
+    :param start: first value
+    :param stop: last value allowed
+    :param step: spacing, must be positive
+    :return: NumPy array; integer inputs give integers, floats are rounded to 9 decimals
+    """
+    values = start + step * np.arange(int(np.floor((stop - start) / step + 1e-9)) + 1)
+    return values if values.dtype.kind in 'iu' else np.round(values, 9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a break-even sweep to CSV or Parquet.")
+    parser.add_argument('output', help="file to write (.csv or .parquet)")
+    parser.add_argument('--loans', type=float, nargs=3, metavar=('FROM', 'TO', 'STEP'), default=(100000, 1200000, 10000))
+    parser.add_argument('--rates', type=float, nargs=3, metavar=('FROM', 'TO', 'STEP'), default=(7, 7, 1))
+    parser.add_argument('--tenors', type=int, nargs='+', default=[360], help="tenors in months")
+    parser.add_argument('--hoa', type=float, nargs='+', default=[200.0], help="monthly HOA fees")
+    parser.add_argument('--maintenance', type=float, nargs='+', default=[15000.0], help="yearly maintenance costs")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="rows computed and written at a time")
+    args = parser.parse_args(argv)
+
+    sweep = Sweep(steps(*args.loans), steps(*args.rates), args.tenors, args.hoa, args.maintenance)
+    started = time.perf_counter()
+    rows = export(sweep, args.output, args.chunk_size)
+    print(f"wrote {rows:,} rows to {args.output} in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
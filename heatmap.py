@@ -0,0 +1,125 @@
+"""
+Net position (buy minus rent) over a grid of any two buy_vs_rent inputs.
+
+The grid is one broadcast call into common_logic. NetPositionHeatmap keeps the buy and rent sides of the
+last grid, so when one input changes only the side that depends on it is recomputed. When an axis range
+changes, only rows and columns with new values are evaluated.
+"""
+import numpy as np
+
+from common_logic import amortization_totals, investment_totals, pmt, rent_totals
+
+# Inputs that move the loan, and through the monthly installment, the renter's budget too
+LOAN_INPUTS = {'interest_rate', 'loan_amount', 'tenor', 'redemption_month'}
+BUY_INPUTS = LOAN_INPUTS | {'hoa', 'yearly_maintenance_cost', 'sticker_profit_from_home_sales'}
+RENT_INPUTS = LOAN_INPUTS | {'monthly_rent', 'inflation', 'initial_deposit', 'annual_returns'}
+
+# Default axis ranges offered by the app: (label, start, stop)
+AXES = {
+    'interest_rate': ("Annual Interest Rate (%)", 1.0, 12.0),
+    'redemption_month': ("Ownership Duration (months)", 12, 360),
+    'loan_amount': ("Loan Amount ($)", 200000.0, 2000000.0),
+    'sticker_profit_from_home_sales': ("Profit from Flipping ($)", 0.0, 1000000.0),
+    'monthly_rent': ("Initial Monthly Rent ($)", 1000.0, 10000.0),
+    'inflation': ("Annual Rent Increase Rate (%)", 0.0, 10.0),
+    'annual_returns': ("Annual Investment Return Rate (%)", 0.0, 12.0),
+    'initial_deposit': ("Mortgage Downpayment/Initial Investment ($)", 0.0, 1000000.0),
+}
+
+
+def buy_side(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, sticker_profit_from_home_sales,
+             tenor=360, **_):
+    # Buy net position, as in buy_vs_rent
+    cumulative_interest_paid, cumulative_principal_paid, _, _, hoa_paid, maintenance_paid = amortization_totals(
+        interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor)
+    return sticker_profit_from_home_sales + cumulative_principal_paid - cumulative_interest_paid - hoa_paid - maintenance_paid
+
+
+def rent_side(interest_rate, loan_amount, redemption_month, monthly_rent, inflation, initial_deposit, annual_returns,
+              tenor=360, **_):
+    # Rent/invest net position, as in buy_vs_rent
+    monthly_payment = pmt(np.asarray(interest_rate, dtype=float) / 12 / 100, tenor, -np.asarray(loan_amount, dtype=float))
+    total_rent_paid, _, _ = rent_totals(monthly_rent, inflation, redemption_month, comparative_mthly_installment=monthly_payment)
+    _, _, final_balance = investment_totals(initial_deposit, monthly_payment - np.asarray(monthly_rent, dtype=float),
+                                            annual_returns, redemption_month, -np.asarray(inflation, dtype=float))
+    return final_balance - total_rent_paid
+
+
+def _evaluate(side, scenario, x_name, x_values, y_name, y_values):
+    # One broadcast call over a (len(y_values), len(x_values)) grid
+    grid = {**scenario, x_name: np.asarray(x_values)[np.newaxis, :], y_name: np.asarray(y_values)[:, np.newaxis]}
+    values = side(**grid)
+    return np.broadcast_to(values, (len(y_values), len(x_values))).astype(float)
+
+
+class NetPositionHeatmap:
+    """
+    Net position over x_name x y_name that is recomputed incrementally as inputs change.
+    :param scenario: dict of buy_vs_rent keyword arguments for everything not on an axis
+    :param x_name: buy_vs_rent argument on the x axis
+    :param x_values: values along the x axis
+    :param y_name: buy_vs_rent argument on the y axis
+    :param y_values: values along the y axis
+    """
+
+    def __init__(self, scenario, x_name, x_values, y_name, y_values):
+        if x_name == y_name:
+            raise ValueError("The two heatmap axes must be different inputs")
+        self.scenario = dict(scenario)
+        self.x_name, self.y_name = x_name, y_name
+        self.x_values, self.y_values = np.asarray(x_values), np.asarray(y_values)
+        self.buy = _evaluate(buy_side, self.scenario, x_name, self.x_values, y_name, self.y_values)
+        self.rent = _evaluate(rent_side, self.scenario, x_name, self.x_values, y_name, self.y_values)
+        self.cells_evaluated = 2 * self.buy.size
+
+    @property
+    def net_position(self):
+        """:return: buy minus rent net position, shaped (len(y_values), len(x_values))"""
+        return self.buy - self.rent
+
+    def update(self, scenario=None, x_values=None, y_values=None):
+        """
+        Applies new inputs, recomputing only what they affect.
+        :param scenario: new values for the non-axis inputs
+        :param x_values: new values along the x axis
+        :param y_values: new values along the y axis
+        :return: the updated net position grid
+        """
+        scenario = dict(self.scenario if scenario is None else scenario)
+        x_values = self.x_values if x_values is None else np.asarray(x_values)
+        y_values = self.y_values if y_values is None else np.asarray(y_values)
+        changed = {name for name in scenario.keys() | self.scenario.keys()
+                   if name not in (self.x_name, self.y_name) and scenario.get(name) != self.scenario.get(name)}
+        self.cells_evaluated = 0
+
+        for side, inputs, attribute in ((buy_side, BUY_INPUTS, 'buy'), (rent_side, RENT_INPUTS, 'rent')):
+            if changed & inputs:
+                setattr(self, attribute, _evaluate(side, scenario, self.x_name, x_values, self.y_name, y_values))
+                self.cells_evaluated += x_values.size * y_values.size
+            else:
+                setattr(self, attribute, self._reuse(side, getattr(self, attribute), scenario, x_values, y_values))
+
+        self.scenario, self.x_values, self.y_values = scenario, x_values, y_values
+        return self.net_position
+
+    def _reuse(self, side, grid, scenario, x_values, y_values):
+        # Keep cells whose axis values are unchanged and evaluate only the new rows and columns
+        if np.array_equal(x_values, self.x_values) and np.array_equal(y_values, self.y_values):
+            return grid
+        old_x = {value: index for index, value in enumerate(self.x_values.tolist())}
+        old_y = {value: index for index, value in enumerate(self.y_values.tolist())}
+        kept_x = np.array([value in old_x for value in x_values.tolist()], dtype=bool)
+        kept_y = np.array([value in old_y for value in y_values.tolist()], dtype=bool)
+
+        result = np.empty((len(y_values), len(x_values)))
+        if kept_x.any() and kept_y.any():
+            result[np.ix_(kept_y, kept_x)] = grid[np.ix_([old_y[value] for value in y_values[kept_y].tolist()],
+                                                         [old_x[value] for value in x_values[kept_x].tolist()])]
+        if (~kept_y).any():
+            result[~kept_y, :] = _evaluate(side, scenario, self.x_name, x_values, self.y_name, y_values[~kept_y])
+            self.cells_evaluated += (~kept_y).sum() * len(x_values)
+        if (~kept_x).any() and kept_y.any():
+            result[np.ix_(kept_y, ~kept_x)] = _evaluate(side, scenario, self.x_name, x_values[~kept_x],
+                                                        self.y_name, y_values[kept_y])
+            self.cells_evaluated += kept_y.sum() * (~kept_x).sum()
+        return result
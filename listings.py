@@ -0,0 +1,271 @@
+"""
+Scores many candidate homes against the same rent.
+
+Listings are streamed from a .csv or .parquet file (Parquet needs pyarrow) in fixed-size chunks. Each chunk
+becomes one vectorized common_logic.buy_vs_rent call under the user's rent, return and loan assumptions, and
+chunks are sharded across a process pool with a bounded number in flight, so memory stays flat however long
+the file is. Every result is written out in input order as soon as its chunk is done. A heap keeps the best
+listings seen so far for the ranking.
+
+    python listings.py listings.csv -o results.csv --top 20 --workers 8
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from common_logic import DEFAULT_SCENARIO, buy_vs_rent
+
+# Listing columns with their defaults; None means required
+LISTING_COLUMNS = {
+    'price': None,
+    'down_payment': None,
+    'hoa': 0.0,
+    'taxes': 0.0,  # Yearly taxes and other expenses, like yearly_maintenance_cost
+    'appreciation': 3.0,  # Expected yearly price growth (in %)
+}
+ID_COLUMN = 'id'
+
+# Assumptions shared by every listing, with the app's defaults
+DEFAULT_ASSUMPTIONS = {key: DEFAULT_SCENARIO[key] for key in (
+    'interest_rate', 'year_tenor', 'redemption_year', 'monthly_rent', 'inflation', 'annual_returns')}
+
+RESULT_COLUMNS = ('loan_amount', 'monthly_payment', 'sticker_profit_from_home_sales', 'buy_net_position',
+                  'rent_net_position', 'net_position')
+
+
+def _float_column(values):
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        # Blank cells become NaN and are filled with the column default
+        return np.array([np.nan if value in (None, '') else float(value) for value in values], dtype=float)
+
+
+def _chunk(ids, values, present, line_numbers=None):
+    # Turns raw column values into float arrays, filling the missing and blank ones with defaults
+    columns = {}
+    for name, default in LISTING_COLUMNS.items():
+        if name not in present:
+            if default is None:
+                raise ValueError(f"Listings are missing the required column {name!r}")
+            columns[name] = np.full(len(ids), default)
+            continue
+        column = _float_column(values[name])
+        if default is None and np.isnan(column).any():
+            blank = int(np.flatnonzero(np.isnan(column))[0])
+            where = f"line {line_numbers[blank]}" if line_numbers is not None else f"listing {ids[blank]!r}"
+            raise ValueError(f"Column {name!r} is blank on {where}")
+        columns[name] = np.where(np.isnan(column), default, column) if default is not None else column
+    return ids, columns
+
+
+def _check_columns(present):
+    unknown = set(present) - set(LISTING_COLUMNS) - {ID_COLUMN}
+    if unknown:
+        raise ValueError(f"Unknown listing columns: {', '.join(sorted(unknown))}")
+
+
+def _read_csv(path, chunk_size):
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        _check_columns(header)
+        # Blank lines are skipped; each row keeps its line number for the error messages
+        numbered_rows = ((row, reader.line_num) for row in reader if row)
+        first = 0
+        while True:
+            chunk = list(itertools.islice(numbered_rows, chunk_size))
+            if not chunk:
+                break
+            rows, line_numbers = [], []
+            for row, line_number in chunk:
+                if len(row) > len(header):
+                    raise ValueError(f"Line {line_number} has more cells than the header")
+                # Missing trailing cells are blank, so they get the column default like any blank cell
+                rows.append(row + [''] * (len(header) - len(row)))
+                line_numbers.append(line_number)
+            values = dict(zip(header, zip(*rows)))
+            ids = (list(values[ID_COLUMN]) if ID_COLUMN in values
+                   else [str(first + index + 1) for index in range(len(rows))])
+            first += len(rows)
+            yield _chunk(ids, values, values, line_numbers)
+
+
+def _read_parquet(path, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading .parquet listings needs pyarrow (pip install pyarrow)") from None
+
+    parquet_file = pq.ParquetFile(path)
+    present = parquet_file.schema_arrow.names
+    _check_columns(present)
+    first = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        table = batch.to_pydict()
+        ids = ([str(value) for value in table[ID_COLUMN]] if ID_COLUMN in table
+               else [str(first + index + 1) for index in range(batch.num_rows)])
+        first += batch.num_rows
+        yield _chunk(ids, table, present)
+
+
+def read_listings(path, chunk_size=50000):
+    """
+    Streams a listings file in chunks
+    :param path: .csv or .parquet file with the LISTING_COLUMNS and an optional id column
+    :param chunk_size: listings per chunk
+    :return: iterator of (ids, dict of float arrays keyed by LISTING_COLUMNS)
+    """
+    if path.endswith('.csv'):
+        return _read_csv(path, chunk_size)
+    if path.endswith('.parquet'):
+        return _read_parquet(path, chunk_size)
+    raise ValueError(f"Unsupported listings file {path!r}, expected .csv or .parquet")
+
+
+def evaluate_chunk(columns, assumptions):
+    """
+    Runs buy_vs_rent on one chunk of listings
+    :param columns: dict of float arrays keyed by LISTING_COLUMNS
+    :param assumptions: dict with the DEFAULT_ASSUMPTIONS keys
+    :return: dict of arrays keyed by RESULT_COLUMNS
+    """
+    redemption_month = int(assumptions['redemption_year'] * 12)
+    loan_amount = np.maximum(columns['price'] - columns['down_payment'], 0.0)
+    sticker_profit = columns['price'] * ((1 + columns['appreciation'] / 100) ** (redemption_month / 12) - 1)
+    results = buy_vs_rent(
+        assumptions['interest_rate'], loan_amount, redemption_month, columns['hoa'], columns['taxes'], sticker_profit,
+        assumptions['monthly_rent'], assumptions['inflation'], columns['down_payment'], assumptions['annual_returns'],
+        tenor=int(assumptions['year_tenor'] * 12))
+    results['loan_amount'] = loan_amount
+    results['sticker_profit_from_home_sales'] = sticker_profit
+    return {name: np.broadcast_to(results[name], loan_amount.shape) for name in RESULT_COLUMNS}
+
+
+def evaluate_listings(chunks, assumptions, n_workers=1):
+    """
+    Evaluates chunks in order, sharding them across a process pool. At most two chunks per worker are in flight,
+    so the input is never read much further ahead than the output.
+    :param chunks: iterator of (ids, columns) as yielded by read_listings
+    :param assumptions: dict with the DEFAULT_ASSUMPTIONS keys
+    :param n_workers: worker processes; 1 evaluates in this process
+    :return: iterator of (ids, columns, results)
+    """
+    if n_workers <= 1:
+        for ids, columns in chunks:
+            yield ids, columns, evaluate_chunk(columns, assumptions)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        pending = deque()
+        for ids, columns in chunks:
+            pending.append((ids, columns, pool.submit(evaluate_chunk, columns, assumptions)))
+            if len(pending) >= 2 * n_workers:
+                ids, columns, future = pending.popleft()
+                yield ids, columns, future.result()
+        while pending:
+            ids, columns, future = pending.popleft()
+            yield ids, columns, future.result()
+
+
+class TopListings:
+    """
+    Keeps the k listings with the highest net_position (buy - rent) seen so far.
+    :param k: number of listings kept
+    """
+
+    def __init__(self, k=20):
+        self.k = k
+        self._heap = []  # Min-heap of (net_position, sequence, row)
+        self._sequence = itertools.count()
+
+    def add(self, ids, columns, results):
+        if self.k <= 0:
+            return
+        net_position = results['net_position']
+        # Only a chunk's own top k can make it into the overall top k
+        candidates = np.argpartition(-net_position, self.k - 1)[:self.k] if len(net_position) > self.k else range(len(net_position))
+        for index in candidates:
+            value = float(net_position[index])
+            if len(self._heap) >= self.k and value <= self._heap[0][0]:
+                continue
+            row = _row(ids[index], columns, results, index)
+            entry = (value, next(self._sequence), row)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            else:
+                heapq.heapreplace(self._heap, entry)
+
+    def ranked(self):
+        """:return: list of result rows, best first"""
+        return [row for _, _, row in sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))]
+
+
+def _row(listing_id, columns, results, index):
+    row = {ID_COLUMN: listing_id}
+    row.update((name, float(column[index])) for name, column in columns.items())
+    row.update((name, round(float(column[index]), 2)) for name, column in results.items())
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score home listings against renting and investing.")
+    parser.add_argument('listings', help="listings file (.csv or .parquet) with columns: " + ', '.join(LISTING_COLUMNS))
+    parser.add_argument('-o', '--output', help="file for every result in input order (.csv or .jsonl)")
+    parser.add_argument('--top', type=int, default=20, help="number of best listings to print")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="listings evaluated per vectorized batch")
+    for key, default in DEFAULT_ASSUMPTIONS.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=float, default=default, help=f"(default {default})")
+    args = parser.parse_args(argv)
+    assumptions = {key: getattr(args, key) for key in DEFAULT_ASSUMPTIONS}
+
+    started = time.perf_counter()
+    output = open(args.output, 'w', newline='') if args.output else None
+    as_jsonl = bool(args.output) and args.output.endswith('.jsonl')
+    fieldnames = (ID_COLUMN,) + tuple(LISTING_COLUMNS) + RESULT_COLUMNS
+    writer = None
+    if output is not None and not as_jsonl:
+        writer = csv.writer(output)
+        writer.writerow(fieldnames)
+    top = TopListings(args.top)
+    evaluated = 0
+    try:
+        for ids, columns, results in evaluate_listings(read_listings(args.listings, args.chunk_size), assumptions,
+                                                       args.workers):
+            top.add(ids, columns, results)
+            evaluated += len(ids)
+            if output is None:
+                continue
+            # Money is written to the cent, which also keeps the float formatting cheap
+            values = [column.tolist() for column in columns.values()]
+            values += [np.round(column, 2).tolist() for column in results.values()]
+            if as_jsonl:
+                for row in zip(ids, *values):
+                    output.write(json.dumps(dict(zip(fieldnames, row))) + '\n')
+            else:
+                writer.writerows(zip(ids, *values))
+    finally:
+        if output is not None:
+            output.close()
+
+    print(f"evaluated {evaluated} listings in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    ranked = top.ranked()
+    if ranked:
+        table = csv.DictWriter(sys.stdout, fieldnames=['rank'] + list(ranked[0]))
+        table.writeheader()
+        for rank, row in enumerate(ranked, 1):
+            table.writerow({'rank': rank, **row})
+
+
+if __name__ == '__main__':
+    main()
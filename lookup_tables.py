@@ -0,0 +1,86 @@
+"""
+Precomputed lookup tables for the standard rate/tenor grid.
+
+Most traffic uses rates from 0% to 20% in 0.125% steps and 10, 15, 20 or 30 year tenors. The build step
+writes the normalized ($1 loan) cumulative interest and outstanding principal curves for that grid into one
+.npy file. At runtime the file is memory-mapped, so loading costs next to nothing and only the curves that
+are actually used get paged in. Inputs off the grid fall back to live computation in schedule.UnitScheduleIndex.
+
+    python lookup_tables.py build [path]
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+from amortization import loan_balance, pmt
+
+RATE_STEP = 0.125
+RATES = np.arange(0, 20 + RATE_STEP / 2, RATE_STEP)
+TENORS = (120, 180, 240, 360)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rate_tenor_tables.npy')
+
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def build(path=DEFAULT_PATH):
+    """
+    Writes the curves as a (rates, tenors, 2, max tenor) float64 array: [..., 0, :] is the cumulative interest and
+    [..., 1, :] the outstanding principal of a $1 loan after each month. Months past a tenor stay at their final values.
+    :param path: .npy file to write; the grid axes go to a .json file next to it
+    :return: path
+    """
+    tables = np.zeros((len(RATES), len(TENORS), 2, max(TENORS)))
+    months = np.arange(1, max(TENORS) + 1)
+    monthly_interest = RATES[:, np.newaxis] / 12 / 100
+    for column, tenor in enumerate(TENORS):
+        monthly_payment = pmt(monthly_interest, tenor, -1.0)
+        paying_months, outstanding = loan_balance(monthly_interest, 1.0, monthly_payment, months, tenor)
+        tables[:, column, 1, :] = outstanding
+        tables[:, column, 0, :] = paying_months * monthly_payment - (1.0 - outstanding)
+
+    np.save(path, tables)
+    with open(_metadata_path(path), 'w') as f:
+        json.dump({'rates': RATES.tolist(), 'tenors': list(TENORS)}, f)
+    return path
+
+
+class LookupTables:
+    """
+    Memory-mapped view of a built table file.
+    :param path: .npy file written by build()
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        with open(_metadata_path(path)) as f:
+            metadata = json.load(f)
+        self.rates = np.asarray(metadata['rates'])
+        self.tenors = {tenor: column for column, tenor in enumerate(metadata['tenors'])}
+        self.tables = np.load(path, mmap_mode='r')
+
+    def lookup(self, interest_rate, tenor):
+        """
+        :return: (2, tenor) read-only view of the $1 loan's cumulative interest and outstanding principal,
+                 or None if (interest_rate, tenor) is not on the grid
+        """
+        column = self.tenors.get(tenor)
+        row = int(np.abs(self.rates - interest_rate).argmin())
+        if column is None or abs(self.rates[row] - interest_rate) > 1e-9:
+            return None
+        return self.tables[row, column, :, :tenor]
+
+
+def load(path=DEFAULT_PATH):
+    """:return: LookupTables for path, or None if the tables have not been built"""
+    if not os.path.exists(path) or not os.path.exists(_metadata_path(path)):
+        return None
+    return LookupTables(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        sys.exit("usage: python lookup_tables.py build [path]")
+    print(f"wrote {build(*sys.argv[2:3])}")
@@ -0,0 +1,134 @@
+"""
+Monte Carlo version of the buy vs rent comparison.
+
+Each path draws its own yearly rent inflation, market return and home appreciation, and optionally its own
+ARM rate resets. All paths are advanced together one year at a time, so the cost grows with the number of
+years, not months, and every step is a NumPy operation over all paths. Very large runs can be sharded across a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from adjustable import arm_rate_path, segment_totals
+from amortization import geometric_sum
+from common_logic import amortization_totals
+from profiling import instrument
+
+# Paths are drawn in fixed-size chunks with their own seeds, so results do not depend on n_workers
+CHUNK_PATHS = 50000
+
+
+def _draw(rng, mean, vol, shape):
+    return mean + vol * rng.standard_normal(shape) if vol else np.full(shape, float(mean))
+
+
+def _simulate_chunk(seed, n_paths, params):
+    # Evaluates one chunk of paths and returns (buy_net_position, rent_net_position)
+    rng = np.random.default_rng(seed)
+    redemption_month = params['redemption_month']
+    n_years = -(-redemption_month // 12)
+    rent_inflation = _draw(rng, params['inflation'], params['inflation_vol'], (n_paths, n_years))
+    annual_returns = _draw(rng, params['annual_returns'], params['returns_vol'], (n_paths, n_years))
+    appreciation = _draw(rng, params['appreciation'], params['appreciation_vol'], (n_paths, n_years))
+
+    # Buy side. A fixed-rate loan is the same on every path; an ARM gets its own random resets per path
+    cumulative_interest_paid, cumulative_principal_paid, _, monthly_payment, hoa_paid, maintenance_paid = amortization_totals(
+        params['interest_rate'], params['loan_amount'], redemption_month, params['hoa'],
+        params['yearly_maintenance_cost'], params['tenor'])
+    rate_resets = params['rate_resets']
+    if rate_resets:
+        fixed_months, reset_every = rate_resets.get('fixed_months', 60), rate_resets.get('reset_every', 12)
+        n_resets = max(-(-(min(redemption_month, params['tenor']) - fixed_months) // reset_every), 0)
+        rate_moves = rate_resets.get('rate_vol', 1.0) * rng.standard_normal((n_paths, n_resets))
+        segment_starts, segment_rates = arm_rate_path(
+            params['interest_rate'], params['interest_rate'] + np.cumsum(rate_moves, axis=1), fixed_months, reset_every,
+            rate_resets.get('periodic_cap'), rate_resets.get('lifetime_cap'), rate_resets.get('floor', 0.0))
+        arm = segment_totals(segment_starts, segment_rates, params['loan_amount'], redemption_month, params['hoa'],
+                             params['yearly_maintenance_cost'], params['tenor'])
+        # The renter's budget stays pegged to the initial installment, which every path shares
+        cumulative_interest_paid, cumulative_principal_paid = arm['cumulative_interest_paid'], arm['cumulative_principal_paid']
+    months_in_year = np.minimum(12, redemption_month - 12 * np.arange(n_years))
+    home_price = params['loan_amount'] + params['initial_deposit']
+    price_growth = np.prod((1 + appreciation / 100) ** (months_in_year / 12), axis=1)
+    sale_profit = home_price * (price_growth - 1)
+    buy_net_position = sale_profit + cumulative_principal_paid - cumulative_interest_paid - hoa_paid - maintenance_paid
+
+    # Rent side, stepped a year at a time exactly like rent_calculator and investment_calculator
+    cap = monthly_payment if monthly_payment else np.inf
+    monthly_rent = np.full(n_paths, min(params['monthly_rent'], cap))
+    monthly_contribution = np.full(n_paths, monthly_payment - params['monthly_rent'])
+    balance = np.full(n_paths, float(params['initial_deposit']))
+    total_rent_paid = np.zeros(n_paths)
+    for year, months in enumerate(months_in_year):
+        monthly_returns = annual_returns[:, year] / 12 / 100
+        total_rent_paid += months * monthly_rent
+        balance = balance * (1 + monthly_returns) ** months + monthly_contribution * geometric_sum(monthly_returns, months)
+        monthly_rent = np.minimum(monthly_rent * (1 + rent_inflation[:, year] / 100), cap)
+        monthly_contribution = monthly_contribution * (1 - rent_inflation[:, year] / 100)  # Less is left once rent goes up
+    rent_net_position = balance - total_rent_paid
+
+    return buy_net_position, rent_net_position
+
+
+@instrument
+def simulate(n_paths, interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, monthly_rent,
+             inflation, initial_deposit, annual_returns, tenor=360, inflation_vol=1.0, returns_vol=15.0,
+             appreciation=3.0, appreciation_vol=5.0, seed=None, n_workers=1,
+             rate_resets=None, percentiles=(5, 25, 50, 75, 95), return_paths=False):
+    """
+    Simulates the buy and rent/invest net positions over n_paths random paths
+    :param n_paths: number of simulated paths
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param monthly_rent: initial monthly rent (in $)
+    :param inflation: mean yearly rent inflation (in %)
+    :param initial_deposit: mortgage downpayment, invested instead when renting (in $)
+    :param annual_returns: mean annual investment return (in %)
+    :param tenor: (in months)
+    :param inflation_vol: standard deviation of the yearly rent inflation (in % points)
+    :param returns_vol: standard deviation of the yearly investment return (in % points)
+    :param appreciation: mean yearly home price appreciation (in %); the home costs loan_amount + initial_deposit
+    :param appreciation_vol: standard deviation of the yearly home price appreciation (in % points)
+    :param rate_resets: optional dict turning the loan into an ARM with random resets. Keys: fixed_months (60),
+                        reset_every (12), rate_vol (1.0, std of the rate move per reset in % points),
+                        periodic_cap, lifetime_cap and floor (0.0), as in adjustable.arm_rate_path
+    :param seed: seed for reproducible runs
+    :param n_workers: processes to shard the paths over; 1 runs in-process
+    :param percentiles: percentiles reported for each distribution
+    :param return_paths: also return the per-path net positions
+    :return: dict with the probability that buying wins, mean and percentiles of buy, rent and net (buy - rent) positions
+    """
+    params = {
+        'interest_rate': interest_rate, 'loan_amount': loan_amount, 'redemption_month': int(redemption_month),
+        'hoa': hoa, 'yearly_maintenance_cost': yearly_maintenance_cost, 'monthly_rent': monthly_rent,
+        'inflation': inflation, 'initial_deposit': initial_deposit, 'annual_returns': annual_returns, 'tenor': tenor,
+        'inflation_vol': inflation_vol, 'returns_vol': returns_vol, 'appreciation': appreciation,
+        'appreciation_vol': appreciation_vol, 'rate_resets': rate_resets,
+    }
+    chunk_sizes = [min(CHUNK_PATHS, n_paths - start) for start in range(0, n_paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    if n_workers > 1 and len(chunk_sizes) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            chunks = list(pool.map(_simulate_chunk, seeds, chunk_sizes, [params] * len(chunk_sizes)))
+    else:
+        chunks = [_simulate_chunk(chunk_seed, size, params) for chunk_seed, size in zip(seeds, chunk_sizes)]
+
+    buy_net_position = np.concatenate([buy for buy, _ in chunks])
+    rent_net_position = np.concatenate([rent for _, rent in chunks])
+    net_position = buy_net_position - rent_net_position
+
+    result = {
+        'n_paths': n_paths,
+        'probability_buy_wins': float(np.mean(net_position > 0)),
+        'percentiles': list(percentiles),
+    }
+    for name, values in (('buy_net_position', buy_net_position), ('rent_net_position', rent_net_position),
+                         ('net_position', net_position)):
+        result[name] = {'mean': float(values.mean()), 'percentiles': np.percentile(values, percentiles).tolist()}
+        if return_paths:
+            result[name]['paths'] = values
+    return result
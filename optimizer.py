@@ -0,0 +1,125 @@
+"""
+Best split of the home price between down payment and loan, and optionally the best tenor.
+
+The home price (loan_amount + initial_deposit in the scenario) is fixed; the down payment moves between the
+two. Both budget constraints bound the down payment directly: the available cash caps it, and the maximum
+monthly payment caps the loan, hence sets a floor on it. So every tenor has an exact feasible interval and
+no penalty terms are needed. Each interval is scanned with a coarse grid, all tenors in one batched
+buy_vs_rent call. Then golden-section search refines the best grid cell of every tenor at once, one batched
+call per iteration. The coarse grid is returned as the objective surface around the optimum.
+"""
+import numpy as np
+
+from common_logic import buy_vs_rent, pmt
+from profiling import instrument
+
+TENORS = (120, 180, 240, 360)
+_INVERSE_PHI = (np.sqrt(5) - 1) / 2
+
+
+def _net_position(scenario, price, down_payment, tenor):
+    return buy_vs_rent(**{**scenario, 'loan_amount': price - down_payment, 'initial_deposit': down_payment,
+                          'tenor': tenor})['net_position']
+
+
+def feasible_down_payments(price, interest_rate, tenors, available_cash, max_monthly_payment=None, min_down_payment=0.0):
+    """
+    Down payment range that satisfies both budget constraints, for each tenor
+    :param price: home price (in $)
+    :param interest_rate: in percentage (8%)
+    :param tenors: array of tenors (in months)
+    :param available_cash: most that can go into the down payment (in $)
+    :param max_monthly_payment: highest affordable installment (in $), None for no limit
+    :param min_down_payment: smallest down payment the lender accepts (in $)
+    :return: (low, high) arrays; low > high where a tenor is infeasible
+    """
+    tenors = np.asarray(tenors)
+    low = np.full(tenors.shape, float(max(min_down_payment, 0.0)))
+    if max_monthly_payment is not None:
+        # The installment is proportional to the loan, so the payment cap is a loan cap
+        max_loan = max_monthly_payment / pmt(interest_rate / 12 / 100, tenors, -1.0)
+        low = np.maximum(low, price - max_loan)
+    high = np.full(tenors.shape, float(min(available_cash, price)))
+    return low, high
+
+
+def _golden_section(objective, low, high, tolerance):
+    # Maximizes objective over [low, high] elementwise; every iteration is one batched objective call
+    low, high = low.copy(), high.copy()
+    inner_low = high - _INVERSE_PHI * (high - low)
+    inner_high = low + _INVERSE_PHI * (high - low)
+    value_low, value_high = objective(np.stack([inner_low, inner_high]))
+    while np.max(high - low) > tolerance:
+        keep_left = value_low > value_high  # The maximum is in [low, inner_high]
+        high = np.where(keep_left, inner_high, high)
+        low = np.where(keep_left, low, inner_low)
+        new_point = np.where(keep_left, high - _INVERSE_PHI * (high - low), low + _INVERSE_PHI * (high - low))
+        new_value = objective(new_point[np.newaxis])[0]
+        inner_low, inner_high = np.where(keep_left, new_point, inner_high), np.where(keep_left, inner_low, new_point)
+        value_low, value_high = np.where(keep_left, new_value, value_high), np.where(keep_left, value_low, new_value)
+    best_is_low = value_low >= value_high
+    return np.where(best_is_low, inner_low, inner_high), np.where(best_is_low, value_low, value_high)
+
+
+@instrument
+def optimize_down_payment(scenario, available_cash, max_monthly_payment=None, min_down_payment=0.0, tenors=None,
+                          grid_size=41, tolerance=1.0):
+    """
+    Finds the down payment (and tenor) that maximizes the buy - rent net position at the scenario's holding period
+    :param scenario: dict of buy_vs_rent keyword arguments; the home price is loan_amount + initial_deposit
+    :param available_cash: most that can go into the down payment (in $)
+    :param max_monthly_payment: highest affordable installment (in $), None for no limit
+    :param min_down_payment: smallest down payment the lender accepts (in $)
+    :param tenors: tenors to choose from (in months); defaults to the scenario's tenor only
+    :param grid_size: coarse grid points per tenor
+    :param tolerance: down payment precision of the refinement (in $)
+    :return: dict with down_payment, loan_amount, tenor, monthly_payment and net_position of the optimum (None
+             when no split satisfies the constraints), best_by_tenor, and surface with the down_payment and
+             net_position grids (one row per tenor, NaN where a tenor is infeasible)
+    """
+    price = scenario['loan_amount'] + scenario['initial_deposit']
+    tenors = np.asarray(tenors if tenors is not None else [scenario.get('tenor', 360)], dtype=int)
+    low, high = feasible_down_payments(price, scenario['interest_rate'], tenors, available_cash, max_monthly_payment,
+                                       min_down_payment)
+    feasible = low <= high
+    surface = {'tenor': tenors, 'down_payment': np.full((len(tenors), grid_size), np.nan),
+               'net_position': np.full((len(tenors), grid_size), np.nan)}
+    result = {'down_payment': None, 'loan_amount': None, 'tenor': None, 'monthly_payment': None, 'net_position': None,
+              'best_by_tenor': {}, 'surface': surface}
+    if not feasible.any():
+        return result
+
+    tenors, low, high = tenors[feasible], low[feasible], high[feasible]
+    column = tenors[:, np.newaxis]
+
+    # Coarse grid over every feasible interval at once
+    grid = low[:, np.newaxis] + (high - low)[:, np.newaxis] * np.linspace(0, 1, grid_size)
+    values = np.broadcast_to(_net_position(scenario, price, grid, column), grid.shape)
+    surface['down_payment'][feasible] = grid
+    surface['net_position'][feasible] = values
+
+    # Refine around each tenor's best grid point; the objective is only assumed unimodal within two cells
+    best = values.argmax(axis=1)
+    rows = np.arange(len(tenors))
+    bracket_low = grid[rows, np.maximum(best - 1, 0)]
+    bracket_high = grid[rows, np.minimum(best + 1, grid_size - 1)]
+    refined, refined_values = _golden_section(
+        lambda points: np.broadcast_to(_net_position(scenario, price, points, tenors), points.shape),
+        bracket_low, bracket_high, tolerance)
+    # Golden-section never returns the bracket ends, so keep the grid point when it is better
+    use_grid = values[rows, best] >= refined_values
+    down_payments = np.where(use_grid, grid[rows, best], refined)
+    net_positions = np.where(use_grid, values[rows, best], refined_values)
+
+    result['best_by_tenor'] = {int(tenor): {'down_payment': float(down_payment), 'net_position': float(net_position)}
+                               for tenor, down_payment, net_position in zip(tenors, down_payments, net_positions)}
+    winner = int(net_positions.argmax())
+    loan_amount = price - down_payments[winner]
+    result.update({
+        'down_payment': float(down_payments[winner]),
+        'loan_amount': float(loan_amount),
+        'tenor': int(tenors[winner]),
+        'monthly_payment': float(pmt(scenario['interest_rate'] / 12 / 100, int(tenors[winner]), -loan_amount)),
+        'net_position': float(net_positions[winner]),
+    })
+    return result
@@ -0,0 +1,145 @@
+"""
+Timing and call-count instrumentation for the hot paths.
+
+Functions decorated with @instrument and blocks wrapped in profiler.span() are timed while the shared
+profiler is enabled. When it is disabled, an instrumented call costs one attribute check on top of the call
+itself. Timings are inclusive: produce_break_even_table includes the DataFrame construction inside it.
+
+The profiler is off by default. Turn it on with profiler.enable(), with the sidebar panel in the apps, or
+by setting BUY_VS_RENT_PROFILE=1. Aggregates can be exported as JSON. Individual calls can be exported as
+a Chrome trace, which opens in chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'started')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.started, time.perf_counter() - self.started)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Thread-safe collector of per-name call counts and timings, plus the most recent individual calls.
+    :param max_events: individual calls kept for the Chrome trace; older ones are dropped
+    """
+
+    def __init__(self, max_events=100000):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stats = {}  # name -> [calls, total, min, max] in seconds
+        self._events = deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._events.clear()
+
+    def record(self, name, started, elapsed):
+        """Adds one call of `elapsed` seconds that started at perf_counter() time `started`"""
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                self._stats[name] = [1, elapsed, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = min(stats[2], elapsed)
+                stats[3] = max(stats[3], elapsed)
+            self._events.append((name, started, elapsed, threading.get_ident()))
+
+    def span(self, name):
+        """Context manager timing the enclosed block under `name`"""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def start(self, name):
+        """Starts timing a span that does not fit in a with block, e.g. a whole Streamlit rerun; :return: token for stop()"""
+        return (name, time.perf_counter()) if self.enabled else None
+
+    def stop(self, token):
+        if token is not None:
+            self.record(token[0], token[1], time.perf_counter() - token[1])
+
+    def stats(self):
+        """:return: dict name -> calls, total_s, mean_s, min_s and max_s, slowest total first"""
+        with self._lock:
+            items = [(name, list(stats)) for name, stats in self._stats.items()]
+        items.sort(key=lambda item: -item[1][1])
+        return {name: {'calls': calls, 'total_s': total, 'mean_s': total / calls, 'min_s': shortest, 'max_s': longest}
+                for name, (calls, total, shortest, longest) in items}
+
+    def to_json(self):
+        """:return: the aggregate statistics as a JSON string"""
+        return json.dumps({'enabled': self.enabled, 'pid': os.getpid(), 'stats': self.stats()}, indent=1)
+
+    def chrome_trace(self):
+        """:return: the recorded calls in the Chrome trace event format, as a JSON string"""
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        return json.dumps({'traceEvents': [
+            {'name': name, 'ph': 'X', 'ts': (started - self._origin) * 1e6, 'dur': elapsed * 1e6, 'pid': pid, 'tid': tid}
+            for name, started, elapsed, tid in events
+        ], 'displayTimeUnit': 'ms'})
+
+
+profiler = Profiler()
+if os.environ.get('BUY_VS_RENT_PROFILE', '') not in ('', '0'):
+    profiler.enable()
+
+
+def instrument(function=None, name=None):
+    """
+    Decorator timing every call of a function with the shared profiler; usable as @instrument or @instrument(name=...)
+    :param name: label in the statistics, defaults to the function name
+    """
+    def decorate(function):
+        label = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(label, started, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorate(function) if function is not None else decorate
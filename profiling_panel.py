@@ -0,0 +1,51 @@
+"""
+Optional profiling panel in the sidebar, shared by both Streamlit apps.
+
+The profiler and the scenario cache are shared by every session of the server process, so the panel shows the
+load of all users, not just this one. Each rerun of the script is recorded as rerun:<app name>.
+"""
+import pandas as pd
+import streamlit as st
+
+from profiling import profiler
+from scenario_cache import scenario_cache
+
+
+def start(app_name):
+    """
+    Renders the on/off switch and starts timing this rerun. Call it before any calculation.
+    :return: token to pass to finish()
+    """
+    enabled = st.sidebar.checkbox("Profiling", value=profiler.enabled,
+                                  help="Times the calculators for every session of this server process.")
+    if enabled:
+        profiler.enable()
+    else:
+        profiler.disable()
+    return profiler.start(f"rerun:{app_name}")
+
+
+def finish(token):
+    """Stops timing this rerun and renders the statistics. Call it at the very end of the script."""
+    profiler.stop(token)
+    if not profiler.enabled:
+        return
+
+    with st.sidebar:
+        st.subheader("Profile")
+        stats = profiler.stats()
+        if stats:
+            st.dataframe(pd.DataFrame({
+                'Calls': [entry['calls'] for entry in stats.values()],
+                'Total (ms)': [entry['total_s'] * 1000 for entry in stats.values()],
+                'Mean (ms)': [entry['mean_s'] * 1000 for entry in stats.values()],
+                'Max (ms)': [entry['max_s'] * 1000 for entry in stats.values()],
+            }, index=pd.Index(list(stats), name="Name")).round(3))
+        cache = scenario_cache.stats()
+        st.write(f"Cache: **{cache['hits']:,}** hits, **{cache['misses']:,}** misses "
+                 f"(**{cache['hit_rate']:.0%}** hit rate), **{cache['size']:,}**/{cache['maxsize']:,} entries")
+        st.download_button("Download JSON", profiler.to_json(), file_name="profile.json", mime="application/json")
+        st.download_button("Download Chrome trace", profiler.chrome_trace(), file_name="trace.json",
+                           mime="application/json")
+        if st.button("Reset profile"):
+            profiler.reset()
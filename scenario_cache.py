@@ -0,0 +1,165 @@
+"""
+Bounded LRU cache in front of the common_logic calculators.
+
+Streamlit reruns the whole script on every widget change, and every session evaluates the same default
+scenarios. This module keeps one cache per process, so all sessions of both apps share it. It can be used
+outside Streamlit too. Each calculator is cached on its own, and the monthly projection is cached in two
+halves, so changing the rent only reruns rent_projection, and the loan side comes from the cache. Cached arrays are shared by every session, so they
+are made read-only.
+"""
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+
+import common_logic
+
+
+def normalize(value):
+    """
+    Turns an argument into a hashable cache key component. Equal inputs map to the same key: 7, 7.0 and
+    np.float64(7) are all the same rate, and arrays are keyed by their full contents.
+    :raises TypeError: for values that cannot be keyed
+    """
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, np.ndarray) and value.ndim:
+        # The full contents, never the repr, which NumPy abbreviates for large arrays
+        if value.dtype.kind not in 'biuf':
+            return ('ndarray', value.shape) + tuple(normalize(item) for item in value.ravel().tolist())
+        values = np.round(value.astype(float), 9)
+        return ('ndarray', value.shape, values.dtype.str, values.tobytes())
+    try:
+        return round(float(value), 9)
+    except (TypeError, ValueError):
+        raise TypeError(f"Cannot build a cache key from a {type(value).__name__}") from None
+
+
+class ScenarioCache:
+    """
+    Thread-safe LRU cache with hit/miss statistics.
+    :param maxsize: maximum number of cached results before the least recently used one is evicted
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.evictions = 0
+
+    def lookup(self, key):
+        """
+        :param key: hashable key whose first element names the cached function
+        :return: (True, value) on a hit, (False, None) on a miss; counted in the statistics
+        """
+        with self._lock:
+            stats = self._stats.setdefault(key[0], {'hits': 0, 'misses': 0})
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                stats['hits'] += 1
+                return True, self._entries[key]
+            stats['misses'] += 1
+        return False, None
+
+    def store(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for key, or computes, stores and returns it.
+        :param key: hashable key whose first element names the cached function
+        :param compute: zero-argument callable producing the value on a miss
+        """
+        found, value = self.lookup(key)
+        if found:
+            return value
+        # Computed outside the lock so one slow scenario does not block the other sessions
+        value = compute()
+        self.store(key, value)
+        return value
+
+    def stats(self):
+        """:return: dict with overall hits, misses, hit_rate, size and evictions, plus a per-function breakdown"""
+        with self._lock:
+            by_function = {name: dict(counts) for name, counts in self._stats.items()}
+            size = len(self._entries)
+        hits = sum(counts['hits'] for counts in by_function.values())
+        misses = sum(counts['misses'] for counts in by_function.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'size': size,
+            'maxsize': self.maxsize,
+            'evictions': self.evictions,
+            'by_function': by_function,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+            self.evictions = 0
+
+
+scenario_cache = ScenarioCache()
+
+
+def _read_only(value):
+    # Freezes the NumPy arrays of a cached result, so one caller cannot change what the others get
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _read_only(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _read_only(item)
+    return value
+
+
+def cached(function, cache=None, copy_result=False):
+    """
+    Wraps a calculator so calls with equal (normalized) arguments are answered from the cache.
+    :param function: calculator to wrap
+    :param cache: ScenarioCache to use, defaults to the shared scenario_cache
+    :param copy_result: return a copy of the cached value, for mutable results such as DataFrames
+    """
+    signature = inspect.signature(function)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (function.__name__,) + tuple(normalize(value) for value in bound.arguments.values())
+        value = (cache or scenario_cache).get_or_compute(key, lambda: _read_only(function(*args, **kwargs)))
+        return value.copy() if copy_result else value
+
+    return wrapper
+
+
+amortization_calculator = cached(common_logic.amortization_calculator)
+rent_calculator = cached(common_logic.rent_calculator)
+investment_calculator = cached(common_logic.investment_calculator)
+loan_projection = cached(common_logic.loan_projection)
+rent_projection = cached(common_logic.rent_projection)
+produce_break_even_table = cached(common_logic.produce_break_even_table, copy_result=True)
+
+
+def monthly_projection(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                       sticker_profit_from_home_sales, monthly_rent, inflation, initial_deposit, annual_returns, tenor=360):
+    """common_logic.monthly_projection with each half cached; the assembled result is a fresh, writable buffer"""
+    loan, monthly_payment = loan_projection(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                                            tenor)
+    rent = rent_projection(monthly_payment, monthly_rent, inflation, initial_deposit, annual_returns, redemption_month)
+    return common_logic.combine_projections(loan, monthly_payment, rent, sticker_profit_from_home_sales, inflation)
@@ -0,0 +1,221 @@
+"""
+Compact columnar amortization schedules.
+
+AmortizationSchedule is the closed-form schedule engine behind common_logic.amortization_table and
+get_cost_metrics. Instead of one Python list of nine boxed floats per month, it stores only the two columns
+that cannot be derived cheaply, the cumulative interest and the outstanding principal, in one contiguous
+float array. Every other column, including the get_cost_metrics averages, is computed only when
+asked for. Large sweeps can keep thousands of schedules in memory this way.
+
+UnitScheduleIndex exploits that, for a fixed rate and tenor, every amortization quantity scales linearly with
+the loan amount (HOA and maintenance do not depend on it). It keeps one loan-of-$1 schedule per (rate, tenor)
+and answers any loan amount by scaling. Standard rates and tenors are read from the memory-mapped
+lookup_tables file when it has been built.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import lookup_tables
+from amortization import cost_averages, finish_cost_metrics, loan_balance, pmt
+from profiling import profiler
+
+# Columns of amortization_table, in order, followed by the ones get_cost_metrics adds
+TABLE_COLUMNS = ("payment", "year", "month", "monthly_payment", "interest_paid",
+                 "cumulative_interest_paid", "outstanding_principal", "hoa_paid", "maintenance_paid")
+COST_METRICS_COLUMNS = TABLE_COLUMNS + (
+    'loan_amt', 'avr_monthly_interest', 'total_interest_and_fees', 'total_fees', 'avr_monthly_fees',
+    'avr_monthly_interest_and_fees', 'avr_monthly_principal', 'avr_monthly_interest_and_principal',
+    'avr_monthly_interest_principal_fees')
+COST_AVERAGE_COLUMNS = COST_METRICS_COLUMNS[len(TABLE_COLUMNS) + 1:]
+# What amortization.cost_averages computes them from
+COST_AVERAGE_INPUTS = ('payment', 'cumulative_interest_paid', 'hoa_paid', 'maintenance_paid', 'loan_amt')
+
+
+class AmortizationSchedule:
+    """
+    Amortization schedule backed by a (2, months) float array. Columns are read with schedule['name'].
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param months: number of monthly rows
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param tenor: (in months)
+    :param data: precomputed (2, months) array of cumulative interest and outstanding principal
+    """
+    __slots__ = ('interest_rate', 'loan_amount', 'hoa', 'yearly_maintenance_cost', 'tenor', 'monthly_payment', 'data')
+
+    def __init__(self, interest_rate, loan_amount, months, hoa, yearly_maintenance_cost, tenor=360, data=None):
+        self.interest_rate = interest_rate
+        self.loan_amount = loan_amount
+        self.hoa = hoa
+        self.yearly_maintenance_cost = yearly_maintenance_cost
+        self.tenor = tenor
+        monthly_interest = interest_rate / 12 / 100
+        self.monthly_payment = pmt(monthly_interest, tenor, -loan_amount)
+
+        if data is None:
+            payment = np.arange(1, max(min(months, tenor), 0) + 1)
+            data = np.empty((2, len(payment)))
+            _, data[1] = loan_balance(monthly_interest, loan_amount, self.monthly_payment, payment, tenor)
+            data[0] = payment * self.monthly_payment - (loan_amount - data[1])
+        self.data = data
+
+    @classmethod
+    def from_table_args(cls, interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+        """Schedule with the same rows as amortization_table (which stops one month short of redemption)"""
+        return cls(interest_rate, loan_amount, redemption_month - 1, hoa, yearly_maintenance_cost, tenor)
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def column(self, name, rows=slice(None)):
+        """
+        Computes one column, optionally only for a slice of rows
+        :param name: any name in COST_METRICS_COLUMNS
+        :param rows: slice of rows to compute
+        :return: NumPy array; stored columns are returned as read-only views
+        """
+        return self.columns((name,), rows)[name]
+
+    def columns(self, names, rows=slice(None)):
+        """
+        Computes several columns at once; the row numbers and the averages are worked out only once
+        :param names: names in COST_METRICS_COLUMNS
+        :param rows: slice of rows to compute
+        :return: dict of NumPy arrays keyed by name; stored columns are returned as read-only views
+        """
+        start, stop, step = rows.indices(len(self))
+        payment = np.arange(start + 1, stop + 1, step)
+        averages = None
+        result = {}
+        for name in names:
+            if name in COST_AVERAGE_COLUMNS:
+                if averages is None:
+                    averages = cost_averages(self.columns(COST_AVERAGE_INPUTS, rows), self.tenor)
+                result[name] = averages[name]
+            else:
+                result[name] = self._base_column(name, rows, payment)
+        return result
+
+    def _base_column(self, name, rows, payment):
+        if name == 'payment':
+            return payment
+        if name == 'year':
+            return (payment - 1) // 12 + 1
+        if name == 'month':
+            return payment % 12
+        if name in ('cumulative_interest_paid', 'outstanding_principal'):
+            view = self.data[0 if name == 'cumulative_interest_paid' else 1, rows]
+            view.flags.writeable = False
+            return view
+        if name == 'monthly_payment':
+            return np.full(len(payment), float(self.monthly_payment))
+        if name == 'interest_paid':
+            # Charged on the balance left after the previous month
+            previous = np.where(payment > 1, self.data[1][np.maximum(payment - 2, 0)], float(self.loan_amount))
+            return previous * (self.interest_rate / 12 / 100)
+        if name == 'hoa_paid':
+            return payment * float(self.hoa)
+        if name == 'maintenance_paid':
+            return payment * (self.yearly_maintenance_cost / 12)
+        if name == 'loan_amt':
+            return np.full(len(payment), float(self.loan_amount))
+        raise KeyError(name)
+
+    def to_frame(self, columns=TABLE_COLUMNS, rows=slice(None)):
+        """
+        Builds a pandas DataFrame of the requested columns. Stored columns are handed over without copying.
+        :param columns: column names, defaults to the amortization_table columns
+        :param rows: slice of rows to include; the index keeps the original row positions
+        """
+        import pandas as pd  # Imported lazily, like in common_logic
+
+        start, stop, step = rows.indices(len(self))
+        data = self.columns(columns, rows)
+        with profiler.span('DataFrame'):
+            return pd.DataFrame(data, index=pd.RangeIndex(start, stop, step), copy=False)
+
+    def to_table(self):
+        """:return: the schedule as amortization_table's list of lists"""
+        return [list(row) for row in zip(*(column.tolist() for column in self.columns(TABLE_COLUMNS).values()))]
+
+
+class UnitScheduleIndex:
+    """
+    LRU index of normalized (loan of $1, no fees) schedules keyed by (interest_rate, tenor).
+    :param maxsize: number of (rate, tenor) schedules kept
+    :param tables: optional lookup_tables.LookupTables consulted before computing a schedule live
+    """
+
+    def __init__(self, maxsize=256, tables=None):
+        self.maxsize = maxsize
+        self.tables = tables
+        self._schedules = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def unit(self, interest_rate, tenor=360):
+        """:return: the full-tenor AmortizationSchedule of a $1 loan at interest_rate"""
+        key = (round(float(interest_rate), 9), int(tenor))
+        with self._lock:
+            if key in self._schedules:
+                self._schedules.move_to_end(key)
+                self.hits += 1
+                return self._schedules[key]
+            self.misses += 1
+        # Grid inputs are a view into the memory-mapped tables; anything else is computed live
+        data = self.tables.lookup(*key) if self.tables is not None else None
+        unit = AmortizationSchedule(key[0], 1.0, key[1], 0.0, 0.0, key[1], data=data)
+        with self._lock:
+            self._schedules[key] = unit
+            while len(self._schedules) > self.maxsize:
+                self._schedules.popitem(last=False)
+        return unit
+
+    def schedule(self, interest_rate, loan_amount, months, hoa, yearly_maintenance_cost, tenor=360):
+        """:return: AmortizationSchedule for loan_amount, scaled from the cached unit schedule"""
+        unit = self.unit(interest_rate, tenor)
+        months = max(min(months, tenor), 0)
+        return AmortizationSchedule(interest_rate, loan_amount, months, hoa, yearly_maintenance_cost, tenor,
+                                    data=unit.data[:, :months] * loan_amount)
+
+    def cost_metrics(self, interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor=360):
+        """
+        Same as common_logic.cost_metrics_grid for one rate and tenor, with loan_amount as a scalar or an array.
+        Costs one cached schedule however many loan amounts are asked for.
+        :return: dict of arrays keyed by the get_cost_metrics column names, rounded to 2 decimals
+        """
+        unit = self.unit(interest_rate, tenor)
+        loan_amount = np.asarray(loan_amount, dtype=float)
+        # amortization_table stops one month short of the redemption month
+        payment = min(max(redemption_month - 1, 0), len(unit))
+        row = slice(payment - 1, payment) if payment else slice(0, 0)
+        unit_row = {name: (unit.column(name, row)[0] if payment else np.nan)
+                    for name in ('interest_paid', 'cumulative_interest_paid', 'outstanding_principal')}
+
+        metrics = {
+            'payment': np.int64(payment),
+            'year': np.int64((payment - 1) // 12 + 1),
+            'month': np.int64(payment % 12),
+            'monthly_payment': loan_amount * unit.monthly_payment,
+            'interest_paid': loan_amount * unit_row['interest_paid'],
+            'cumulative_interest_paid': loan_amount * unit_row['cumulative_interest_paid'],
+            'outstanding_principal': loan_amount * unit_row['outstanding_principal'],
+            'hoa_paid': payment * np.asarray(hoa, dtype=float),
+            'maintenance_paid': payment * np.asarray(yearly_maintenance_cost, dtype=float) / 12,
+            'loan_amt': loan_amount,
+        }
+        return finish_cost_metrics(metrics, tenor)
+
+
+unit_schedules = UnitScheduleIndex(tables=lookup_tables.load())
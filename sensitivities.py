@@ -0,0 +1,186 @@
+"""
+Partial derivatives of the buy and rent/invest net positions with respect to every input, in one pass.
+
+The comparison is evaluated once on dual numbers, which carry the value together with its gradient with
+respect to all inputs (forward-mode differentiation), instead of 2N finite-difference reruns. The model is
+the year-stepped form of buy_vs_rent: closed-form amortization, rent stepped yearly and capped at the
+installment, and contributions shrinking by the rent inflation. It is written with annuity factors instead of
+dividing by the rate, so a 0% rate has exact derivatives too. The holding period is a whole number of
+months, so its "derivative" is the change from holding one month longer.
+"""
+import math
+
+import numpy as np
+
+from profiling import instrument
+
+INPUTS = ('interest_rate', 'loan_amount', 'monthly_rent', 'inflation', 'annual_returns', 'hoa', 'yearly_maintenance_cost',
+          'initial_deposit', 'sticker_profit_from_home_sales')
+OUTPUTS = ('buy_net_position', 'rent_net_position', 'net_position')
+
+# Input change each tornado bar shows: 1 % point for rates, 10% of the value for amounts, a year for the holding period
+TORNADO_STEPS = {'interest_rate': 1.0, 'inflation': 1.0, 'annual_returns': 1.0, 'redemption_month': 12}
+
+
+class Dual:
+    """
+    A value with its gradient with respect to the model inputs.
+    :param value: float value
+    :param grad: NumPy array of partial derivatives, one per input
+    """
+    __slots__ = ('value', 'grad')
+
+    def __init__(self, value, grad):
+        self.value = float(value)
+        self.grad = grad
+
+    @staticmethod
+    def _lift(other, size):
+        return other if isinstance(other, Dual) else Dual(other, np.zeros(size))
+
+    def __add__(self, other):
+        if not isinstance(other, Dual):
+            return Dual(self.value + other, self.grad)
+        return Dual(self.value + other.value, self.grad + other.grad)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Dual(-self.value, -self.grad)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        if not isinstance(other, Dual):
+            return Dual(self.value * other, self.grad * other)
+        return Dual(self.value * other.value, self.grad * other.value + other.grad * self.value)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if not isinstance(other, Dual):
+            return Dual(self.value / other, self.grad / other)
+        return Dual(self.value / other.value, (self.grad * other.value - other.grad * self.value) / other.value ** 2)
+
+    def __rtruediv__(self, other):
+        return Dual._lift(other, len(self.grad)) / self
+
+    def __pow__(self, exponent):
+        # Only constant exponents are needed: months and years
+        return Dual(self.value ** exponent, self.grad * (exponent * self.value ** (exponent - 1)))
+
+    def __lt__(self, other):
+        return self.value < float(other)
+
+    def __gt__(self, other):
+        return self.value > float(other)
+
+    def __float__(self):
+        return self.value
+
+
+def _minimum(a, b):
+    # The derivative of the branch that is active
+    return a if float(a) <= float(b) else b
+
+
+def _annuity(rate, periods):
+    # ((1 + rate)^periods - 1) / rate, i.e. sum of (1 + rate)^k for k < periods, exact at rate 0 as well
+    if float(rate) == 0:
+        return Dual(periods, rate.grad * (periods * (periods - 1) / 2)) if isinstance(rate, Dual) else float(periods)
+    return ((1 + rate) ** periods - 1) / rate
+
+
+def _model(inputs, redemption_month, tenor):
+    # buy_vs_rent on Dual inputs, one year at a time; returns (buy_net_position, rent_net_position)
+    interest_rate, loan_amount, monthly_rent, inflation, annual_returns, hoa, yearly_maintenance_cost, \
+        initial_deposit, sticker_profit_from_home_sales = inputs
+
+    # Buy side, as in amortization_totals
+    monthly_interest = interest_rate / 12 / 100
+    months = min(max(redemption_month, 0), tenor)
+    monthly_payment = loan_amount * (1 + monthly_interest) ** tenor / _annuity(monthly_interest, tenor)
+    if months >= tenor:
+        outstanding_principal = 0.0
+    else:
+        outstanding_principal = (loan_amount * (1 + monthly_interest) ** months
+                                 - monthly_payment * _annuity(monthly_interest, months))
+    cumulative_interest_paid = months * monthly_payment - (loan_amount - outstanding_principal)
+    buy_net_position = (sticker_profit_from_home_sales + loan_amount - outstanding_principal - cumulative_interest_paid
+                        - months * hoa - months * yearly_maintenance_cost / 12)
+
+    # Rent side, as in rent_totals and investment_totals: rent capped at the installment, the rest invested
+    growth = 1 + inflation / 100
+    monthly_returns = annual_returns / 12 / 100
+    rent = _minimum(monthly_rent, monthly_payment) if float(monthly_payment) else monthly_rent
+    contribution = monthly_payment - monthly_rent
+    total_rent_paid = 0.0
+    balance = initial_deposit
+    for year in range(math.ceil(redemption_month / 12)):
+        months_in_year = min(12, redemption_month - 12 * year)
+        total_rent_paid = total_rent_paid + months_in_year * rent
+        balance = balance * (1 + monthly_returns) ** months_in_year + contribution * _annuity(monthly_returns, months_in_year)
+        rent = rent * growth
+        if float(monthly_payment):
+            rent = _minimum(rent, monthly_payment)
+        contribution = contribution * (2 - growth)  # Shrinks by the rent inflation
+    return buy_net_position, balance - total_rent_paid
+
+
+@instrument
+def sensitivities(interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost,
+                  sticker_profit_from_home_sales, monthly_rent, inflation, initial_deposit, annual_returns, tenor=360):
+    """
+    Net positions of buy_vs_rent with their partial derivatives, from a single forward-mode pass
+    :param interest_rate: in percentage (8%)
+    :param loan_amount: (in $)
+    :param redemption_month: (# months)
+    :param hoa: monthly HOA fee (in $)
+    :param yearly_maintenance_cost: yearly maintenance cost (in $)
+    :param sticker_profit_from_home_sales: profit from flipping the property (in $)
+    :param monthly_rent: initial monthly rent (in $)
+    :param inflation: yearly rent inflation rate (in %)
+    :param initial_deposit: mortgage downpayment, invested instead when renting (in $)
+    :param annual_returns: annual investment return rate (in %)
+    :param tenor: (in months)
+    :return: dict with the OUTPUTS values, and 'derivatives' mapping each output to {input: partial derivative};
+             the redemption_month entry is the change when holding one month longer
+    """
+    values = dict(interest_rate=interest_rate, loan_amount=loan_amount, monthly_rent=monthly_rent, inflation=inflation,
+                  annual_returns=annual_returns, hoa=hoa, yearly_maintenance_cost=yearly_maintenance_cost,
+                  initial_deposit=initial_deposit, sticker_profit_from_home_sales=sticker_profit_from_home_sales)
+    identity = np.eye(len(INPUTS))
+    inputs = [Dual(values[name], identity[index]) for index, name in enumerate(INPUTS)]
+
+    buy, rent = _model(inputs, int(redemption_month), int(tenor))
+    next_buy, next_rent = _model([float(value) for value in inputs], int(redemption_month) + 1, int(tenor))
+    outputs = {'buy_net_position': (buy, float(next_buy)), 'rent_net_position': (rent, float(next_rent)),
+               'net_position': (buy - rent, float(next_buy) - float(next_rent))}
+
+    result = {name: float(value) for name, (value, _) in outputs.items()}
+    result['derivatives'] = {}
+    for name, (value, next_value) in outputs.items():
+        grad = Dual._lift(value, len(INPUTS)).grad
+        derivatives = dict(zip(INPUTS, grad.tolist()))
+        derivatives['redemption_month'] = next_value - float(value)
+        result['derivatives'][name] = derivatives
+    return result
+
+
+def tornado(result, scenario, output='net_position'):
+    """
+    Linearized change of an output when each input moves by its TORNADO_STEPS step (10% of its value for amounts)
+    :param result: dict returned by sensitivities
+    :param scenario: the inputs passed to sensitivities, to size the 10% steps
+    :param output: one of OUTPUTS
+    :return: list of (input name, step, change in $), largest absolute change first
+    """
+    bars = []
+    for name, derivative in result['derivatives'][output].items():
+        step = TORNADO_STEPS.get(name, 0.1 * abs(scenario[name]))
+        bars.append((name, step, derivative * step))
+    return sorted(bars, key=lambda bar: -abs(bar[2]))
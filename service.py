@@ -0,0 +1,378 @@
+"""
+Local JSON service for the calculators, built on the standard library only.
+
+    python service.py serve --port 8000
+    python service.py bench --requests 5000 --concurrency 32
+
+Endpoints (POST a JSON object, or a list of objects to get a list back):
+    /amortization     amortization_totals: interest_rate, loan_amount, redemption_month, hoa, yearly_maintenance_cost, tenor
+    /rent             rent_totals: monthly_rent, inflation, redemption_month, comparative_mthly_installment
+    /investment       investment_totals: initial_deposit, monthly_contribution, annual_returns, investment_months,
+                      annual_contribution_incr_pct
+    /buy_vs_rent      buy_vs_rent: the full comparison, same arguments as the function
+    /break_even_table produce_break_even_table: interest, tenor, hoa, maintenance
+    GET /stats        cache and batching statistics
+
+Requests for the same endpoint that arrive within a short window are coalesced into one vectorized call,
+which runs on a worker pool. Results are cached by normalized inputs in a ScenarioCache.
+"""
+import argparse
+import http.client
+import inspect
+import json
+import math
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import common_logic
+from scenario_cache import ScenarioCache, normalize
+
+_REQUIRED = inspect.Parameter.empty
+_INTEGER_PARAMETERS = {'redemption_month', 'tenor', 'investment_months'}
+# Smallest accepted value; below these the calculators divide by zero
+_MINIMUMS = {'redemption_month': 1, 'tenor': 1, 'investment_months': 0}
+
+# function: calculator; outputs: names of its tuple results, None when it returns a dict; batched: vectorizable
+Endpoint = namedtuple('Endpoint', ['function', 'outputs', 'batched'])
+ENDPOINTS = {
+    '/amortization': Endpoint(common_logic.amortization_totals,
+                              ('cumulative_interest_paid', 'cumulative_principal_paid', 'outstanding_principal',
+                               'monthly_payment', 'hoa_paid', 'maintenance_paid'), True),
+    '/rent': Endpoint(common_logic.rent_totals, ('total_rent_paid', 'average_monthly_rent', 'final_monthly_rent'), True),
+    '/investment': Endpoint(common_logic.investment_totals,
+                            ('total_savings_invested', 'total_investment_gains', 'final_balance'), True),
+    '/buy_vs_rent': Endpoint(common_logic.buy_vs_rent, None, True),
+    '/break_even_table': Endpoint(common_logic.produce_break_even_table, None, False),
+}
+
+
+def _parameters(function):
+    return {name: parameter.default for name, parameter in inspect.signature(function).parameters.items()
+            if name != 'loan_amounts'}
+
+
+def _arguments(path, payload):
+    # Validates one request object into a complete dict of numeric arguments
+    if not isinstance(payload, dict):
+        raise ValueError("Each request must be a JSON object")
+    parameters = _parameters(ENDPOINTS[path].function)
+    unknown = set(payload) - set(parameters)
+    if unknown:
+        raise ValueError(f"Unknown arguments: {', '.join(sorted(unknown))}")
+    arguments = {}
+    for name, default in parameters.items():
+        value = payload.get(name, default)
+        if value is _REQUIRED:
+            raise ValueError(f"Missing argument {name!r}")
+        if value is None:
+            value = 0  # comparative_mthly_installment: 0 means no cap, same as None
+        try:
+            number = float(value)
+            if not math.isfinite(number):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"Argument {name!r} must be a finite number") from None
+        if name in _INTEGER_PARAMETERS:
+            # Truncating 12.5 months to 12 would answer a different question than the one asked
+            if not number.is_integer():
+                raise ValueError(f"Argument {name!r} must be a whole number")
+            number = int(number)
+        arguments[name] = number
+        if arguments[name] < _MINIMUMS.get(name, -math.inf):
+            raise ValueError(f"Argument {name!r} must be at least {_MINIMUMS[name]}")
+    return arguments
+
+
+def _finite(value):
+    # JSON has no NaN or Infinity; results that overflow are sent as null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _evaluate_batch(path, batch):
+    # Runs one endpoint over a list of argument dicts with a single vectorized call
+    endpoint = ENDPOINTS[path]
+    if not endpoint.batched:
+        return [endpoint.function(**arguments).to_dict(orient='records') for arguments in batch]
+
+    columns = {name: np.array([arguments[name] for arguments in batch]) for name in batch[0]}
+    results = endpoint.function(**columns)
+    if endpoint.outputs is not None:
+        results = dict(zip(endpoint.outputs, results))
+    values = {name: np.broadcast_to(value, len(batch)).tolist() for name, value in results.items()}
+    return [{name: column[index] for name, column in values.items()} for index in range(len(batch))]
+
+
+class Batcher:
+    """
+    Coalesces the requests of one endpoint that arrive within `window` seconds into one batch.
+    :param path: endpoint path
+    :param pool: executor the batches run on
+    :param window: seconds to wait for more requests after the first one
+    :param max_batch: largest batch
+    """
+
+    def __init__(self, path, pool, window=0.002, max_batch=4096):
+        self.path = path
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._collect, daemon=True, name=f"batcher{path}").start()
+
+    def submit(self, arguments):
+        """:return: Future of the result dict"""
+        future = Future()
+        self._queue.put((arguments, future))
+        return future
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.batches += 1
+            self.requests += len(batch)
+            self.pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            results = _evaluate_batch(self.path, [arguments for arguments, _ in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                batch[0][1].set_exception(error)
+                return
+            # The batch mixes requests from different clients; rerun them one by one so a bad one fails only itself
+            for item in batch:
+                self._run([item])
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+class ScenarioService:
+    """
+    The HTTP server with its batchers, worker pool and cache.
+    :param host: interface to listen on
+    :param port: port to listen on, 0 picks a free one
+    :param window: batching window (in seconds)
+    :param workers: threads evaluating batches
+    :param cache_size: cached results
+    """
+
+    def __init__(self, host='127.0.0.1', port=8000, window=0.002, workers=4, cache_size=100000):
+        self.cache = ScenarioCache(cache_size)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.batchers = {path: Batcher(path, self.pool, window) for path in ENDPOINTS}
+        self.server = _Server((host, port), _Handler)
+        self.server.service = self
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def evaluate(self, path, payloads):
+        """
+        Answers a list of request objects for one endpoint, from the cache where possible
+        :return: list of result dicts in the same order
+        """
+        # Every item is checked before any is batched, so a bad request fails on its own and costs no evaluation
+        checked = [_arguments(path, payload) for payload in payloads]
+        keys = []
+        results = []
+        for arguments in checked:
+            key = (path,) + tuple(normalize(value) for value in arguments.values())
+            found, result = self.cache.lookup(key)
+            keys.append(key)
+            results.append(result if found else self.batchers[path].submit(arguments))
+        for index, (key, result) in enumerate(zip(keys, results)):
+            if isinstance(result, Future):
+                results[index] = result.result()
+                self.cache.store(key, results[index])
+        return results
+
+    def stats(self):
+        return {
+            'cache': self.cache.stats(),
+            'batching': {path: {'batches': batcher.batches, 'requests': batcher.requests,
+                                'mean_batch': batcher.requests / batcher.batches if batcher.batches else 0.0}
+                         for path, batcher in self.batchers.items()},
+        }
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        """Serves from a background thread, e.g. for the benchmark"""
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.pool.shutdown()
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128  # The default backlog of 5 resets connections under concurrent load
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # Headers and body are separate writes; Nagle would hold the body ~40 ms
+
+    def _reply(self, status, body):
+        data = json.dumps(_finite(body), allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.server.service.stats())
+        else:
+            self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path not in ENDPOINTS:
+            self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+        try:
+            payload = json.loads(body or b'{}')
+            payloads = payload if isinstance(payload, list) else [payload]
+            results = self.server.service.evaluate(self.path, payloads)
+        except ValueError as error:  # Includes malformed JSON
+            self._reply(400, {'error': str(error)})
+            return
+        except Exception as error:
+            self._reply(500, {'error': f"{type(error).__name__}: {error}"})
+            return
+        self._reply(200, results if isinstance(payload, list) else results[0])
+
+    def log_message(self, format, *args):
+        pass  # One line per request would cost more than the evaluation
+
+
+def _random_scenario(rng):
+    return {
+        'interest_rate': round(rng.uniform(2, 9), 3), 'loan_amount': round(rng.uniform(1e5, 2e6)),
+        'redemption_month': rng.randint(12, 360), 'hoa': round(rng.uniform(0, 800)),
+        'yearly_maintenance_cost': round(rng.uniform(0, 20000)), 'sticker_profit_from_home_sales': round(rng.uniform(0, 5e5)),
+        'monthly_rent': round(rng.uniform(1000, 8000)), 'inflation': round(rng.uniform(0, 8), 2),
+        'initial_deposit': round(rng.uniform(0, 5e5)), 'annual_returns': round(rng.uniform(0, 10), 2), 'tenor': 360,
+    }
+
+
+def run_load_test(host, port, n_requests=5000, concurrency=32, path='/buy_vs_rent', distinct=None, seed=0):
+    """
+    Sends random /buy_vs_rent scenarios from `concurrency` keep-alive clients and measures latency
+    :param distinct: number of distinct scenarios to draw from (repeats hit the cache); None makes every request distinct
+    :return: dict with requests, errors, seconds, throughput (requests/s), p50_ms and p99_ms
+    """
+    rng = random.Random(seed)
+    pool = [_random_scenario(rng) for _ in range(distinct or n_requests)]
+    bodies = [json.dumps(pool[index % len(pool)] if distinct is None else rng.choice(pool)).encode()
+              for index in range(n_requests)]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    next_index = iter(range(n_requests))
+
+    def client():
+        connection = http.client.HTTPConnection(host, port)
+        own = []
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                break
+            started = time.perf_counter()
+            try:
+                connection.request('POST', path, bodies[index], {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as error:
+                connection.close()  # Reconnects on the next request
+                errors.append(error)
+                continue
+            own.append(time.perf_counter() - started)
+            if response.status != 200:
+                errors.append(response.status)
+        connection.close()
+        with lock:
+            latencies.extend(own)
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    seconds = time.perf_counter() - started
+    return {
+        'requests': n_requests,
+        'errors': len(errors),
+        'seconds': seconds,
+        'throughput': n_requests / seconds,
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON service for the buy vs rent calculators.")
+    parser.add_argument('command', choices=('serve', 'bench'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help="serve: port to listen on (default 8000); "
+                                                                "bench: port of a running service (default: start one)")
+    parser.add_argument('--window-ms', type=float, default=2.0, help="batching window")
+    parser.add_argument('--workers', type=int, default=4, help="threads evaluating batches")
+    parser.add_argument('--requests', type=int, default=5000, help="bench: requests to send")
+    parser.add_argument('--concurrency', type=int, default=32, help="bench: concurrent clients")
+    parser.add_argument('--distinct', type=int, default=None, help="bench: distinct scenarios, so repeats hit the cache")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        service = ScenarioService(args.host, 8000 if args.port is None else args.port, args.window_ms / 1000, args.workers)
+        print(f"serving on http://{service.address[0]}:{service.address[1]}")
+        service.serve_forever()
+        return
+
+    service = None
+    host, port = args.host, args.port
+    if port is None:
+        service = ScenarioService(args.host, 0, args.window_ms / 1000, args.workers).start()
+        host, port = service.address
+    report = run_load_test(host, port, args.requests, args.concurrency, distinct=args.distinct)
+    print(f"{report['requests']} requests, {report['errors']} errors in {report['seconds']:.2f} s: "
+          f"{report['throughput']:.0f} req/s, p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms")
+    if service is not None:
+        batching = service.stats()['batching']['/buy_vs_rent']
+        print(f"mean batch size {batching['mean_batch']:.1f}")
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Break-even points of the buy vs rent comparison.
+
+The net position (buy minus rent) is linear in the sale profit, increases with the rent, and is stepped
+yearly in the holding period. Each break-even point is solved from those shapes with bracketing, using
+the closed-form buy_vs_rent model, instead of scanning inputs one rerun at a time.
+"""
+import numpy as np
+
+from common_logic import buy_vs_rent
+from profiling import instrument
+
+
+def _net_position(scenario, **overrides):
+    return buy_vs_rent(**{**scenario, **overrides})['net_position']
+
+
+def break_even_month(scenario, max_month=None):
+    """
+    First holding month at which buying beats (or ties) renting
+    :param scenario: dict of buy_vs_rent keyword arguments; redemption_month is ignored
+    :param max_month: last month to search, defaults to the tenor
+    :return: month number, or None if renting wins over the whole search range
+    """
+    max_month = int(max_month or scenario.get('tenor', 360))
+    # Bracket on year ends first; the model only changes regime once a year
+    checkpoints = np.unique(np.concatenate(([1], np.arange(12, max_month, 12), [max_month])))
+    net_position = _net_position(scenario, redemption_month=checkpoints)
+    winning = np.flatnonzero(net_position >= 0)
+    if not len(winning):
+        return None
+    if winning[0] == 0:
+        return 1
+
+    # Bisect the months between the last losing and first winning checkpoint
+    low, high = int(checkpoints[winning[0] - 1]), int(checkpoints[winning[0]])
+    while high - low > 1:
+        middle = (low + high) // 2
+        if _net_position(scenario, redemption_month=middle) >= 0:
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+def break_even_sale_profit(scenario):
+    """
+    Smallest profit from selling the property at which buying ties renting. The net position moves dollar for
+    dollar with the sale profit, so this is exact with one evaluation.
+    :param scenario: dict of buy_vs_rent keyword arguments; sticker_profit_from_home_sales is ignored
+    :return: required sale profit (in $); negative means buying wins even when selling at a loss
+    """
+    return float(-_net_position(scenario, sticker_profit_from_home_sales=0))
+
+
+def break_even_rent(scenario, tolerance=0.01, max_rent=1e7):
+    """
+    Initial monthly rent at which buying ties renting. A higher rent only hurts the renter (more rent paid, less
+    left to invest), so buying wins at any rent at or above this level.
+    :param scenario: dict of buy_vs_rent keyword arguments; monthly_rent is ignored
+    :param tolerance: precision of the answer (in $)
+    :param max_rent: give up above this rent
+    :return: monthly rent (in $), 0 if buying wins even rent-free, or None if renting wins up to max_rent
+    """
+    low, high = 0.0, 1000.0
+    if _net_position(scenario, monthly_rent=low) >= 0:
+        return 0.0
+    # Grow the bracket until buying wins at the top of it
+    while _net_position(scenario, monthly_rent=high) < 0:
+        low, high = high, high * 2
+        if high > max_rent:
+            return None
+
+    while high - low > tolerance:
+        middle = (low + high) / 2
+        if _net_position(scenario, monthly_rent=middle) >= 0:
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+@instrument
+def solve_break_even(scenario):
+    """
+    :param scenario: dict of buy_vs_rent keyword arguments
+    :return: dict with break_even_month, break_even_sale_profit and break_even_rent
+    """
+    return {
+        'break_even_month': break_even_month(scenario),
+        'break_even_sale_profit': break_even_sale_profit(scenario),
+        'break_even_rent': break_even_rent(scenario),
+    }
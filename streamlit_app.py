@@ -1,5 +1,17 @@
 import streamlit as st
-from common_logic import amortization_calculator, rent_calculator, investment_calculator  # Import the function from common_logic.py
+from scenario_cache import monthly_projection  # Cached wrapper over common_logic.py
+from montecarlo import simulate
+from solver import solve_break_even
+import altair as alt
+import numpy as np
+import pandas as pd
+from heatmap import AXES, NetPositionHeatmap
+from events import ExtraPrincipal, LumpSum, Refinance, best_refinance_month, buy_net_position
+from optimizer import TENORS, optimize_down_payment
+from sensitivities import sensitivities, tornado
+import profiling_panel
+
+profile_token = profiling_panel.start('streamlit_app')
 
 st.title("Buy vs Rent Decision Tool")
 
@@ -57,24 +69,59 @@ with col2:
 
     st.markdown("</div>", unsafe_allow_html=True)
 
-# Call the amortization_calculator function with user input
-cumulative_interest_paid, cumulative_principal_paid, outstanding_principal, monthly_payment, hoa_paid, maintenance_paid = amortization_calculator(
-    interest_rate, loan_amount, redemption_month, hoa_fee, yearly_maintenance_cost, tenor)
-actual_profit = (loan_amount + initial_deposit + sticker_profit_from_home_sales) - initial_deposit - cumulative_interest_paid - hoa_paid - maintenance_paid - outstanding_principal
+# Prepayment and refinance events
+with st.expander("Prepayments and refinancing"):
+    ev_col1, ev_col2 = st.columns(2)
+    with ev_col1:
+        lump_sum = st.number_input("One-off Prepayment ($)", min_value=0.0, value=0.0)
+        lump_sum_month = st.number_input("Prepayment Month", min_value=1, value=12)
+        extra_principal = st.number_input("Extra Principal Every Month ($)", min_value=0.0, value=0.0)
+    with ev_col2:
+        refinance = st.checkbox("Refinance")
+        refinance_month = st.number_input("Refinance Month", min_value=1, value=24)
+        refinance_rate = st.number_input("New Annual Interest Rate (%)", min_value=0.0, max_value=20.0, value=5.0)
+        refinance_year_tenor = st.number_input("New Loan Tenor (years)", min_value=1, value=30)
+        refinance_costs = st.number_input("Refinance Closing Costs ($)", min_value=0.0, value=5000.0)
+        roll_costs = st.checkbox("Add Closing Costs to the New Loan")
+        find_best_month = st.checkbox("Find Best Refinance Month")
 
-# Cosmetics for printing
-cosmetics_rent = min(monthly_rent,monthly_payment)
+loan_events = []
+if lump_sum > 0:
+    loan_events.append(LumpSum(lump_sum_month, lump_sum))
+if extra_principal > 0:
+    loan_events.append(ExtraPrincipal(1, extra_principal))
+if refinance:
+    loan_events.append(Refinance(refinance_month, refinance_rate, refinance_year_tenor * 12, refinance_costs, roll_costs))
 
-# Call the rent_calculator with user input
-total_rent_paid, average_monthly_rent, final_monthly_rent = rent_calculator(monthly_rent, inflation, redemption_month,comparative_mthly_installment=monthly_payment)
+# Project the loan, the rent and the investment month by month in a single pass
+projection, summary, crossover_month = monthly_projection(
+    interest_rate, loan_amount, redemption_month, hoa_fee, yearly_maintenance_cost, sticker_profit_from_home_sales,
+    monthly_rent, inflation, initial_deposit, annual_returns, tenor)
+cumulative_interest_paid = summary['cumulative_interest_paid']
+cumulative_principal_paid = summary['cumulative_principal_paid']
+outstanding_principal = summary['outstanding_principal']
+monthly_payment = summary['monthly_payment']
+hoa_paid = summary['hoa_paid']
+maintenance_paid = summary['maintenance_paid']
+actual_profit = summary['buy_net_position']
+if loan_events:
+    # The buy side is recomputed with the events; the rent side keeps the original installment as its budget
+    actual_profit, event_summary = buy_net_position(
+        interest_rate, loan_amount, redemption_month, hoa_fee, yearly_maintenance_cost, sticker_profit_from_home_sales,
+        tenor, loan_events)
+    cumulative_interest_paid = event_summary['cumulative_interest_paid']
+    cumulative_principal_paid = event_summary['cumulative_principal_paid']
+    outstanding_principal = event_summary['outstanding_principal']
 
-# Call the investment_calculator with user input
-monthly_contribution = monthly_payment - monthly_rent  # Rent, or $3400 monthly contribution
-investment_months = redemption_month  # Calculate returns for 60 months (5 years)
-annual_contribution_incr_pct = -inflation  # annual contribution decreases since more $ going into rent rather than investment
-total_savings_invested, total_investment_gains, final_balance = investment_calculator(
-    initial_deposit, monthly_contribution, annual_returns, investment_months, annual_contribution_incr_pct)
+# Cosmetics for printing
+cosmetics_rent = min(monthly_rent,monthly_payment)
 
+total_rent_paid = summary['total_rent_paid']
+average_monthly_rent = summary['average_monthly_rent']
+final_monthly_rent = summary['final_monthly_rent']
+total_savings_invested = summary['total_savings_invested']
+total_investment_gains = summary['total_investment_gains']
+final_balance = summary['final_balance']
 
 
 # Results Section
@@ -129,6 +176,22 @@ with stats_col1:
     st.write(f"HOA Paid: **${round(hoa_paid):,}**")
     st.write(f"Maintenance/Taxes Paid: **${round(maintenance_paid):,}**")
     st.write(f"Profit less interest & charges: **${round(actual_profit):,}**")
+    if loan_events:
+        st.write(f"Total Prepaid and Paid to the Lender: **${round(event_summary['total_paid']):,}**")
+        if event_summary['closing_costs_paid']:
+            st.write(f"Refinance Closing Costs Paid: **${round(event_summary['closing_costs_paid']):,}**")
+        if event_summary['payoff_month'] is not None:
+            st.write(f"Loan Paid Off in Month: **{event_summary['payoff_month']}**")
+    if find_best_month:
+        best_month, best_position, position_without = best_refinance_month(
+            interest_rate, loan_amount, redemption_month, hoa_fee, yearly_maintenance_cost,
+            sticker_profit_from_home_sales, refinance_rate, refinance_year_tenor * 12, refinance_costs, roll_costs,
+            tenor, [event for event in loan_events if not isinstance(event, Refinance)])
+        if best_month is None:
+            st.write("Best Refinance Month: **refinancing does not pay off before you sell**")
+        else:
+            st.write(f"Best Refinance Month: **{best_month}** (net position **${round(best_position):,}** "
+                     f"vs **${round(position_without):,}** without)")
 
 with stats_col2:
     st.subheader("RENT DETAILS")
@@ -139,6 +202,173 @@ with stats_col2:
     st.write(f"Total Investment Gains: **${round(total_investment_gains):,}**")
     st.write(f"Investment Balance after Cost of Rent: **${round(final_balance - total_rent_paid):,}**")
 
+# Net Position Over Time
+st.subheader("NET POSITION OVER TIME")
+if loan_events:
+    st.caption("The chart shows the loan without prepayments or refinancing.")
+st.line_chart(pd.DataFrame({
+    "Buy": projection['buy_net_position'],
+    "Rent & Invest": projection['rent_net_position'],
+}, index=pd.Index(projection['month'].astype(int), name="Month")))
+if crossover_month is None:
+    st.write("The lines do not cross before you sell.")
+else:
+    st.write(f"The lines cross at month **{crossover_month}**.")
+
+# Break-even Section
+st.subheader("BREAK-EVEN POINTS")
+break_even = solve_break_even(dict(
+    interest_rate=interest_rate, loan_amount=loan_amount, redemption_month=redemption_month, hoa=hoa_fee,
+    yearly_maintenance_cost=yearly_maintenance_cost, sticker_profit_from_home_sales=sticker_profit_from_home_sales,
+    monthly_rent=monthly_rent, inflation=inflation, initial_deposit=initial_deposit, annual_returns=annual_returns,
+    tenor=tenor))
+if break_even['break_even_month'] is None:
+    st.write("Holding Period to Break-even: **renting wins over the whole loan tenor**")
+else:
+    st.write(f"Holding Period to Break-even: **{break_even['break_even_month']}** months")
+st.write(f"Minimum Profit from Flipping for Buying to Win: **${round(break_even['break_even_sale_profit']):,}**")
+if break_even['break_even_rent'] is not None:
+    st.write(f"Buying Wins if Initial Rent is at least: **${round(break_even['break_even_rent']):,}**")
+
+# Sensitivity Section
+st.subheader("WHICH INPUT MATTERS MOST")
+sensitivity_scenario = dict(
+    interest_rate=interest_rate, loan_amount=loan_amount, redemption_month=redemption_month, hoa=hoa_fee,
+    yearly_maintenance_cost=yearly_maintenance_cost, sticker_profit_from_home_sales=sticker_profit_from_home_sales,
+    monthly_rent=monthly_rent, inflation=inflation, initial_deposit=initial_deposit, annual_returns=annual_returns,
+    tenor=tenor)
+sensitivity_labels = {
+    'interest_rate': "Interest Rate +1% pt", 'loan_amount': "Loan Amount +10%", 'monthly_rent': "Initial Rent +10%",
+    'inflation': "Rent Increase +1% pt", 'annual_returns': "Investment Return +1% pt", 'hoa': "HOA Fee +10%",
+    'yearly_maintenance_cost': "Taxes/Maintenance +10%", 'initial_deposit': "Downpayment +10%",
+    'sticker_profit_from_home_sales': "Profit from Flipping +10%", 'redemption_month': "Own 1 Year Longer",
+}
+tornado_data = pd.DataFrame(
+    [(sensitivity_labels[name], change) for name, _, change in tornado(sensitivities(**sensitivity_scenario), sensitivity_scenario)],
+    columns=['input', 'change'])
+st.altair_chart(alt.Chart(tornado_data).mark_bar().encode(
+    x=alt.X('change:Q', title="Change in Buy minus Rent ($)"),
+    y=alt.Y('input:N', title=None, sort=None),
+    color=alt.condition(alt.datum.change > 0, alt.value('pink'), alt.value('lightblue')),
+), use_container_width=True)
+st.caption("Estimated from the exact partial derivatives at your inputs; pink favours buying, blue favours renting.")
+
+# Heatmap Section
+with st.expander("Sensitivity heatmap"):
+    axis_names = list(AXES)
+    hm_col1, hm_col2, hm_col3 = st.columns(3)
+    with hm_col1:
+        x_name = st.selectbox("Horizontal Axis", axis_names, index=0, format_func=lambda name: AXES[name][0])
+    with hm_col2:
+        y_name = st.selectbox("Vertical Axis", axis_names, index=1, format_func=lambda name: AXES[name][0])
+    with hm_col3:
+        resolution = st.slider("Grid Resolution", min_value=10, max_value=200, value=50)
+
+    if x_name == y_name:
+        st.write("Pick two different inputs.")
+    else:
+        def axis_values(name):
+            _, start, stop = AXES[name]
+            if name == 'redemption_month':
+                return np.unique(np.linspace(start, min(stop, tenor), resolution).round().astype(int))
+            return np.linspace(start, stop, resolution)
+
+        heatmap_scenario = dict(
+            interest_rate=interest_rate, loan_amount=loan_amount, redemption_month=redemption_month, hoa=hoa_fee,
+            yearly_maintenance_cost=yearly_maintenance_cost, sticker_profit_from_home_sales=sticker_profit_from_home_sales,
+            monthly_rent=monthly_rent, inflation=inflation, initial_deposit=initial_deposit, annual_returns=annual_returns,
+            tenor=tenor)
+        # Kept across reruns so a slider change only recomputes the affected part of the grid
+        sweep = st.session_state.get('heatmap')
+        if sweep is None or (sweep.x_name, sweep.y_name) != (x_name, y_name):
+            sweep = NetPositionHeatmap(heatmap_scenario, x_name, axis_values(x_name), y_name, axis_values(y_name))
+            st.session_state['heatmap'] = sweep
+        else:
+            sweep.update(heatmap_scenario, axis_values(x_name), axis_values(y_name))
+
+        def cell_edges(values):
+            # The grid is already gridded, so each cell spans halfway to its neighbours instead of being re-binned;
+            # the redemption month axis is not evenly spaced once rounded to whole months
+            values = np.asarray(values, dtype=float)
+            if len(values) == 1:
+                return values - 0.5, values + 0.5
+            middles = (values[:-1] + values[1:]) / 2
+            return (np.concatenate(([values[0] - (middles[0] - values[0])], middles)),
+                    np.concatenate((middles, [values[-1] + (values[-1] - middles[-1])])))
+
+        (x_start, x_stop), (y_start, y_stop) = cell_edges(sweep.x_values), cell_edges(sweep.y_values)
+        heatmap_data = pd.DataFrame({
+            'x': np.tile(x_start, len(y_start)), 'x2': np.tile(x_stop, len(y_start)),
+            'y': np.repeat(y_start, len(x_start)), 'y2': np.repeat(y_stop, len(x_start)),
+            'net': sweep.net_position.ravel(),
+        })
+        alt.data_transformers.disable_max_rows()
+        st.altair_chart(alt.Chart(heatmap_data).mark_rect().encode(
+            x=alt.X('x:Q', title=AXES[x_name][0], scale=alt.Scale(zero=False, nice=False)), x2='x2:Q',
+            y=alt.Y('y:Q', title=AXES[y_name][0], scale=alt.Scale(zero=False, nice=False)), y2='y2:Q',
+            color=alt.Color('net:Q', title="Buy minus Rent ($)", scale=alt.Scale(scheme='redblue', domainMid=0)),
+        ), use_container_width=True)
+
+# Optimizer Section
+with st.expander("Optimize the downpayment"):
+    opt_col1, opt_col2 = st.columns(2)
+    with opt_col1:
+        available_cash = st.number_input("Cash Available for the Downpayment ($)", min_value=0.0, value=initial_deposit)
+        max_monthly_payment = st.number_input("Maximum Monthly Payment ($, 0 for no limit)", min_value=0.0,
+                                              value=float(round(monthly_payment)))
+    with opt_col2:
+        min_down_payment = st.number_input("Minimum Downpayment ($)", min_value=0.0, value=0.0)
+        choose_tenor = st.checkbox("Also Choose the Loan Tenor")
+
+    optimum = optimize_down_payment(
+        dict(interest_rate=interest_rate, loan_amount=loan_amount, redemption_month=redemption_month, hoa=hoa_fee,
+             yearly_maintenance_cost=yearly_maintenance_cost, sticker_profit_from_home_sales=sticker_profit_from_home_sales,
+             monthly_rent=monthly_rent, inflation=inflation, initial_deposit=initial_deposit, annual_returns=annual_returns,
+             tenor=tenor),
+        available_cash, max_monthly_payment or None, min_down_payment,
+        tenors=sorted(set(TENORS) | {tenor}) if choose_tenor else None)
+    if optimum['down_payment'] is None:
+        st.write("No downpayment fits both the cash and the monthly payment limits.")
+    else:
+        st.markdown(f"Put down **${round(optimum['down_payment']):,}** and borrow **${round(optimum['loan_amount']):,}** "
+                    f"over **{optimum['tenor'] // 12}** years (**${round(optimum['monthly_payment']):,}** a month). "
+                    f"Buy minus Rent after {redemption_month} months: **${optimum['net_position']:,.0f}**.")
+        surface = optimum['surface']
+        surface_data = pd.DataFrame({
+            'down_payment': surface['down_payment'].ravel(),
+            'net': surface['net_position'].ravel(),
+            'tenor': np.repeat([f"{t // 12} years" for t in surface['tenor']], surface['down_payment'].shape[1]),
+        }).dropna()
+        st.altair_chart(alt.Chart(surface_data).mark_line().encode(
+            x=alt.X('down_payment:Q', title="Downpayment ($)"),
+            y=alt.Y('net:Q', title="Buy minus Rent ($)"),
+            color=alt.Color('tenor:N', title="Tenor"),
+        ), use_container_width=True)
+
+# Monte Carlo Section
+with st.expander("Simulate uncertain rent, returns and home prices"):
+    mc_col1, mc_col2 = st.columns(2)
+    with mc_col1:
+        n_paths = st.number_input("Simulated Paths", min_value=100, max_value=1000000, value=10000, step=1000)
+        appreciation = st.number_input("Mean Annual Home Appreciation (%)", value=3.0)
+        appreciation_vol = st.number_input("Home Appreciation Volatility (% points)", min_value=0.0, value=5.0)
+    with mc_col2:
+        inflation_vol = st.number_input("Rent Increase Volatility (% points)", min_value=0.0, value=1.0)
+        returns_vol = st.number_input("Investment Return Volatility (% points)", min_value=0.0, value=15.0)
+
+    if st.button("Run Simulation"):
+        simulation = simulate(int(n_paths), interest_rate, loan_amount, redemption_month, hoa_fee, yearly_maintenance_cost,
+                              monthly_rent, inflation, initial_deposit, annual_returns, tenor=tenor,
+                              inflation_vol=inflation_vol, returns_vol=returns_vol, appreciation=appreciation,
+                              appreciation_vol=appreciation_vol)
+        st.markdown(f"Buying beats renting in **{simulation['probability_buy_wins']:.0%}** of **{int(n_paths):,}** simulated paths.")
+        st.table({
+            "Percentile": [f"P{p}" for p in simulation['percentiles']],
+            "Buy Net Position ($)": [f"{v:,.0f}" for v in simulation['buy_net_position']['percentiles']],
+            "Rent Net Position ($)": [f"{v:,.0f}" for v in simulation['rent_net_position']['percentiles']],
+            "Buy minus Rent ($)": [f"{v:,.0f}" for v in simulation['net_position']['percentiles']],
+        })
+
 # FAQ Section
 st.subheader("FAQ")
 st.write("**What are the drawbacks of Buying?**")
@@ -155,3 +385,5 @@ st.write("The Housing Budget is determined by the monthly amount you would spend
 
 st.write("**Where can I peek into the logic?**")
 st.markdown(f"You can find the code powering this tool [here](https://github.com/gabrielzhouyy/buy_vs_rent/blob/main/streamlit_app.py).")
+
+profiling_panel.finish(profile_token)